@@ -0,0 +1,137 @@
+import argparse
+import contextlib
+import functools
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks import fakes
+
+# Benchmark of the stats and ping cycles against SQLite, a fake psutil and a
+# fake ICMP probe. Reports wall time per phase, DB round trips and memory.
+#
+#   python3 -m benchmarks.bench --sensors 10,100,1000,10000
+
+CONFIG = {
+    'node': 'benchmark',
+    'databases': {'system_monitoring': {}, 'whatsapp': {}},
+    'resources-alerts-channel': 'resources',
+    'ping-alerts-channel': 'ping',
+    'sample_interval': 0.05,
+    'devices': True,
+    'alerts': {'cooldown': 900, 'coalesce': 0},
+    'ping': {'timeout': 4, 'attempts': 4, 'flush_size': 500},
+    'spool': {'directory': 'spool', 'batch_size': 500},
+    'thresholds': {
+        'cpu': 30, 'temperature': 85, 'memory': 90, 'swap': 90, 'disk': 90,
+        'network': 100, 'io': 50, 'iowait': 10, 'failures': 5,
+    },
+}
+
+# Hot paths whose time is reported separately, per module
+PHASES = {
+    'scripts.stats': ('collect_snapshot', 'get_latest_system_stats', 'save_to_db', 'save_devices_to_db', 'save_processes_to_db', 'check_thresholds'),
+    'scripts.ping': ('get_sensors_from_db', 'ping_sensors', 'detect_high_pings', 'check_ping_threshold', 'save_ping_to_db'),
+}
+
+def instrument(module, name, phases):
+    function = getattr(module, name)
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            phases[name] = phases.get(name, 0) + time.perf_counter() - start
+
+    setattr(module, name, wrapper)
+
+def load_modules(probe_latency, processes):
+    # Every module must see the fakes before anything imports psutil or mysql
+    sys.modules['psutil'] = fakes.make_psutil(processes=processes)
+    fakes.stub_mysql_connector()
+
+    from functions import alerts, database, spool
+    from scripts import ping, stats
+
+    ping.resolve_hosts, ping.probe_hosts, ping.probe_bursts = fakes.make_probe(probe_latency)
+    return database, spool, alerts, stats, ping
+
+# Run one cycle twice: once for wall time, once under tracemalloc for memory
+def measure(cycle, finish, counters, phases):
+    results = {}
+    for traced in (False, True):
+        for key in counters:
+            counters[key] = 0
+        phases.clear()
+
+        if traced:
+            tracemalloc.start()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            cycle()
+            finish()
+        total = time.perf_counter() - start
+
+        if traced:
+            results['peak_kib'] = tracemalloc.get_traced_memory()[1] / 1024
+            tracemalloc.stop()
+        else:
+            results.update(total=total, phases=dict(phases), **counters)
+    return results
+
+def report(name, sensors, results):
+    phases = " ".join(f"{phase}={seconds * 1000:.1f}" for phase, seconds in results['phases'].items())
+    print(f"{name:<6} {sensors:>7} {results['total'] * 1000:>10.1f} {results['queries']:>8} {results['commits']:>8} "
+          f"{results['connections']:>6} {results['peak_kib']:>10.0f}  {phases}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the stats and ping cycles')
+    parser.add_argument('--sensors', default='10,100,1000,10000', help='comma separated sensor counts')
+    parser.add_argument('--probe-latency', type=float, default=0.05, help='seconds a fake ping sweep takes')
+    parser.add_argument('--processes', type=int, default=0, help='fake processes to rank each stats cycle, 0 to skip')
+    parser.add_argument('--count', type=int, default=1, help='echo requests per sensor, above 1 probes in bursts')
+    arguments = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='system-monitoring-bench-')
+    os.chdir(directory)
+    CONFIG['ping']['count'] = arguments.count
+    CONFIG['processes'] = {'enabled': arguments.processes > 0, 'top': 5, 'budget': 0.2}
+    with open('config.json', 'w') as f:
+        json.dump(CONFIG, f)
+
+    database, spool, alerts, stats, ping = load_modules(arguments.probe_latency, arguments.processes)
+
+    phases = {}
+    for module in (stats, ping):
+        for name in PHASES[module.__name__]:
+            instrument(module, name, phases)
+
+    def finish():
+        spool.flush_spool()
+        alerts.flush_alerts()
+
+    print(f"{'cycle':<6} {'sensors':>7} {'wall ms':>10} {'queries':>8} {'commits':>8} {'conns':>6} {'peak KiB':>10}  phases (ms)")
+    counts = [int(value) for value in arguments.sensors.split(',')]
+    for count in counts:
+        counters = {'queries': 0, 'commits': 0, 'connections': 0}
+        pools = {}
+        for name in ('system_monitoring', 'whatsapp'):
+            path = os.path.join(directory, f"{name}-{count}.sqlite")
+            if os.path.exists(path):
+                os.remove(path)
+            pools[name] = fakes.FakePool(path, counters)
+        database.get_pool = pools.__getitem__
+        fakes.add_sensors(pools['system_monitoring'], count)
+
+        if count == counts[0]:
+            report('stats', 1, measure(stats.display_and_save_info, finish, counters, phases))
+        report('ping', count, measure(ping.collect_and_save_ping_data, finish, counters, phases))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+import random
+import sqlite3
+import sys
+import time
+import types
+from collections import namedtuple
+
+# Stand-ins used by the benchmark: a psutil with synthetic counters, a
+# MySQL-like connection backed by SQLite that counts round trips, and an ICMP
+# probe with injected latency.
+
+CpuTimes = namedtuple('CpuTimes', 'user nice system idle iowait')
+DiskIO = namedtuple('DiskIO', 'read_bytes write_bytes busy_time')
+NetIO = namedtuple('NetIO', 'bytes_recv bytes_sent')
+Partition = namedtuple('Partition', 'device mountpoint fstype opts')
+ProcessCpuTimes = namedtuple('ProcessCpuTimes', 'user system')
+MemoryInfo = namedtuple('MemoryInfo', 'rss vms')
+ProcessIO = namedtuple('ProcessIO', 'read_bytes write_bytes')
+
+# Build a fake psutil module whose counters grow at a steady rate
+def make_psutil(disks=4, nics=2, processes=200):
+    psutil = types.ModuleType('psutil')
+    start = time.monotonic()
+
+    def elapsed():
+        return time.monotonic() - start
+
+    def cpu_times():
+        t = elapsed() * 100
+        return CpuTimes(t * 0.3, 0, t * 0.1, t * 0.55, t * 0.05)
+
+    def disk_io_counters(perdisk=False):
+        t = elapsed()
+        disk = DiskIO(int(t * 20 * 1024**2), int(t * 10 * 1024**2), int(t * 300))
+        if perdisk:
+            return {f"sd{chr(97 + index)}": disk for index in range(disks)}
+        return disk
+
+    def net_io_counters(pernic=False):
+        t = elapsed()
+        nic = NetIO(int(t * 5 * 1024**2), int(t * 2 * 1024**2))
+        if pernic:
+            return {f"eth{index}": nic for index in range(nics)}
+        return nic
+
+    # Process i uses i/processes of a CPU, i MB of memory and i KB/s of disk
+    class Process:
+        def __init__(self, pid):
+            self.pid = pid
+
+        def as_dict(self, attrs=(), ad_value=None):
+            t = elapsed()
+            share = self.pid / processes
+            info = {
+                'name': f"worker-{self.pid}",
+                'cpu_times': ProcessCpuTimes(t * share * 0.8, t * share * 0.2),
+                'memory_info': MemoryInfo(self.pid * 1024**2, self.pid * 2 * 1024**2),
+                'io_counters': ProcessIO(int(t * self.pid * 1024), 0),
+            }
+            return {name: info[name] for name in attrs}
+
+    table = {pid: Process(pid) for pid in range(1, processes + 1)}
+
+    def process_iter(attrs=None, ad_value=None):
+        for process in table.values():
+            process.info = process.as_dict(attrs, ad_value)
+            yield process
+
+    psutil.NoSuchProcess = type('NoSuchProcess', (Exception,), {})
+    psutil.process_iter = process_iter
+    psutil.cpu_times = cpu_times
+    psutil.disk_io_counters = disk_io_counters
+    psutil.net_io_counters = net_io_counters
+    psutil.cpu_percent = lambda interval=None: 40.0
+    psutil.virtual_memory = lambda: types.SimpleNamespace(percent=62.5)
+    psutil.swap_memory = lambda: types.SimpleNamespace(used=1, total=4)
+    psutil.disk_usage = lambda path: types.SimpleNamespace(percent=71.0)
+    psutil.disk_partitions = lambda all=False: [Partition(f"/dev/sd{chr(97 + index)}1", f"/mnt/{index}", 'ext4', 'rw') for index in range(disks)]
+    psutil.sensors_temperatures = lambda: {'coretemp': [types.SimpleNamespace(current=55.0)]}
+    return psutil
+
+# Register stand-in mysql.connector modules when the real driver is missing,
+# the benchmark never talks to MySQL anyway
+def stub_mysql_connector():
+    try:
+        import mysql.connector  # noqa: F401
+        return
+    except ImportError:
+        pass
+
+    mysql = types.ModuleType('mysql')
+    connector = types.ModuleType('mysql.connector')
+    pooling = types.ModuleType('mysql.connector.pooling')
+    connector.Error = type('Error', (Exception,), {})
+    connector.HAVE_CEXT = False
+    pooling.PoolError = type('PoolError', (connector.Error,), {})
+    pooling.MySQLConnectionPool = None
+    connector.pooling = pooling
+    mysql.connector = connector
+    sys.modules.update({'mysql': mysql, 'mysql.connector': connector, 'mysql.connector.pooling': pooling})
+
+SCHEMA = """
+CREATE TABLE system_stats (
+    id INTEGER PRIMARY KEY, node_id TEXT, cpu REAL, cpu_temp REAL, memory REAL, swap REAL, disk REAL,
+    disk_read REAL, disk_write REAL, disk_wait REAL, network_receive REAL, network_transmit REAL,
+    cpu_count INT DEFAULT 0, cpu_temp_count INT DEFAULT 0, memory_count INT DEFAULT 0,
+    swap_count INT DEFAULT 0, disk_count INT DEFAULT 0, disk_read_count INT DEFAULT 0,
+    disk_write_count INT DEFAULT 0, disk_wait_count INT DEFAULT 0,
+    network_receive_count INT DEFAULT 0, network_transmit_count INT DEFAULT 0,
+    timestamp TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE device_stats (
+    id INTEGER PRIMARY KEY, node_id TEXT, kind TEXT, device TEXT, utilization REAL, in_rate REAL, out_rate REAL,
+    timestamp TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE sensors (
+    id INTEGER PRIMARY KEY, name TEXT, ip TEXT, threshold INT,
+    failed INT DEFAULT 0, high_ping_count INT DEFAULT 0, active BOOLEAN DEFAULT FALSE
+);
+CREATE TABLE rollup_watermarks (
+    name TEXT PRIMARY KEY, watermark TEXT
+);
+CREATE TABLE process_stats (
+    id INTEGER PRIMARY KEY, node_id TEXT, ranking TEXT, position INT, pid INT, name TEXT,
+    cpu REAL, memory REAL, io REAL, timestamp TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE latencies (
+    id INTEGER PRIMARY KEY, node_id TEXT, sensor_id INT, response_time REAL,
+    packet_loss REAL, rtt_min REAL, rtt_avg REAL, rtt_max REAL, rtt_mdev REAL, jitter REAL, rtt_p95 REAL,
+    timestamp TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE messages (
+    id INTEGER PRIMARY KEY, phone TEXT, message TEXT
+);
+"""
+
+class FakeCursor:
+    def __init__(self, connection, dictionary=False):
+        self.connection = connection
+        self.dictionary = dictionary
+        self.cursor = connection.db.cursor()
+        self.empty = False
+
+    def execute(self, query, params=()):
+        self.connection.counters['queries'] += 1
+        # SQLite tables are never partitioned
+        self.empty = 'information_schema' in query
+        if not self.empty:
+            self.cursor.execute(query.replace('%s', '?'), tuple(params or ()))
+
+    def convert(self, row):
+        if row is None or not self.dictionary:
+            return row
+        return {column[0]: value for column, value in zip(self.cursor.description, row)}
+
+    def fetchone(self):
+        return None if self.empty else self.convert(self.cursor.fetchone())
+
+    def fetchall(self):
+        return [] if self.empty else [self.convert(row) for row in self.cursor.fetchall()]
+
+    def close(self):
+        self.cursor.close()
+
+class FakeConnection:
+    def __init__(self, path, counters):
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.counters = counters
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self, dictionary)
+
+    def commit(self):
+        self.counters['commits'] += 1
+        self.db.commit()
+
+    def rollback(self):
+        self.db.rollback()
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        pass
+
+    def close(self):
+        self.db.close()
+
+class FakePool:
+    def __init__(self, path, counters):
+        self.path = path
+        self.counters = counters
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+        self.db.close()
+
+    def get_connection(self):
+        self.counters['connections'] += 1
+        return FakeConnection(self.path, self.counters)
+
+def add_sensors(pool, count):
+    db = sqlite3.connect(pool.path)
+    db.executemany(
+        "INSERT INTO sensors (name, ip, threshold, active) VALUES (?, ?, ?, TRUE)",
+        [(f"Sensor {index}", f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}", 30) for index in range(count)],
+    )
+    db.commit()
+    db.close()
+
+# Probe stand-ins: the sweep takes `latency` seconds, a share of requests is lost
+def make_probe(latency, loss=0.05, seed=1):
+    generator = random.Random(seed)
+
+    def resolve_hosts(hosts, workers=32, timeout=None):
+        return {host: host for host in hosts}
+
+    def probe_hosts(targets, timeout=4, attempts=4, budgets=None, open_socket=None, port=0):
+        time.sleep(latency)
+        return {key: None if generator.random() < loss else generator.uniform(5, 60) for key, _ in targets}
+
+    def probe_bursts(targets, count=5, timeout=4, spacing=0.02, open_socket=None, port=0):
+        time.sleep(latency)
+        return {key: [None if generator.random() < loss else generator.uniform(5, 60) for _ in range(count)]
+                for key, _ in targets}
+
+    return resolve_hosts, probe_hosts, probe_bursts
@@ -0,0 +1,55 @@
+-- Index the timestamp lookups and partition the sample tables by day, so that
+-- retention drops whole partitions instead of deleting rows one by one.
+-- Rows past the 30 day retention are deleted first and every remaining day
+-- gets its partition here, so the first cleanup does not copy the whole
+-- history out of pmax. Later days are created by functions/partitions.py on
+-- every cleanup.
+
+-- "PARTITION p20250101 VALUES LESS THAN (...), ..." for the 30 days kept and
+-- the 3 days ahead that functions/partitions.py also creates
+SET SESSION group_concat_max_len = 65536;
+
+WITH RECURSIVE days (day) AS (
+    SELECT CURDATE() - INTERVAL 30 DAY
+    UNION ALL
+    SELECT day + INTERVAL 1 DAY FROM days WHERE day < CURDATE() + INTERVAL 3 DAY
+)
+SELECT GROUP_CONCAT(
+    CONCAT('PARTITION p', DATE_FORMAT(day, '%Y%m%d'), ' VALUES LESS THAN (UNIX_TIMESTAMP(''', day + INTERVAL 1 DAY, ' 00:00:00''))')
+    ORDER BY day SEPARATOR ', '
+) INTO @day_partitions
+FROM days;
+
+DELETE FROM system_stats WHERE timestamp < CURDATE() - INTERVAL 30 DAY;
+
+-- MySQL requires the partitioning column in every unique key
+ALTER TABLE system_stats
+    MODIFY timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (id, timestamp),
+    ADD INDEX idx_system_stats_timestamp (timestamp);
+
+SET @statement = CONCAT('ALTER TABLE system_stats PARTITION BY RANGE (UNIX_TIMESTAMP(timestamp)) (',
+                        @day_partitions, ', PARTITION pmax VALUES LESS THAN MAXVALUE)');
+PREPARE partition_table FROM @statement;
+EXECUTE partition_table;
+DEALLOCATE PREPARE partition_table;
+
+-- Partitioned InnoDB tables cannot have foreign keys, latencies of a deleted
+-- sensor are now removed by the retention window instead of ON DELETE CASCADE
+ALTER TABLE latencies DROP FOREIGN KEY latencies_ibfk_1;
+
+DELETE FROM latencies WHERE timestamp < CURDATE() - INTERVAL 30 DAY;
+
+ALTER TABLE latencies
+    MODIFY timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (id, timestamp),
+    ADD INDEX idx_latencies_sensor_timestamp (sensor_id, timestamp),
+    ADD INDEX idx_latencies_timestamp (timestamp);
+
+SET @statement = CONCAT('ALTER TABLE latencies PARTITION BY RANGE (UNIX_TIMESTAMP(timestamp)) (',
+                        @day_partitions, ', PARTITION pmax VALUES LESS THAN MAXVALUE)');
+PREPARE partition_table FROM @statement;
+EXECUTE partition_table;
+DEALLOCATE PREPARE partition_table;
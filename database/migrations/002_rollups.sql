@@ -0,0 +1,78 @@
+-- Downsampled history, filled incrementally by scripts/rollup.py
+
+CREATE TABLE system_stats_1m (
+    bucket TIMESTAMP NOT NULL,
+    metric VARCHAR(32) NOT NULL,
+    min FLOAT,
+    max FLOAT,
+    avg FLOAT,
+    p95 FLOAT,
+    samples INT NOT NULL,
+    PRIMARY KEY (bucket, metric)
+);
+
+CREATE TABLE system_stats_1h (
+    bucket TIMESTAMP NOT NULL,
+    metric VARCHAR(32) NOT NULL,
+    min FLOAT,
+    max FLOAT,
+    avg FLOAT,
+    p95 FLOAT,
+    samples INT NOT NULL,
+    PRIMARY KEY (bucket, metric)
+);
+
+CREATE TABLE system_stats_1d (
+    bucket TIMESTAMP NOT NULL,
+    metric VARCHAR(32) NOT NULL,
+    min FLOAT,
+    max FLOAT,
+    avg FLOAT,
+    p95 FLOAT,
+    samples INT NOT NULL,
+    PRIMARY KEY (bucket, metric)
+);
+
+CREATE TABLE latencies_1m (
+    bucket TIMESTAMP NOT NULL,
+    sensor_id INT NOT NULL,
+    min FLOAT,
+    max FLOAT,
+    avg FLOAT,
+    p95 FLOAT,
+    samples INT NOT NULL,
+    failures INT NOT NULL,
+    PRIMARY KEY (sensor_id, bucket),
+    INDEX idx_latencies_1m_bucket (bucket)
+);
+
+CREATE TABLE latencies_1h (
+    bucket TIMESTAMP NOT NULL,
+    sensor_id INT NOT NULL,
+    min FLOAT,
+    max FLOAT,
+    avg FLOAT,
+    p95 FLOAT,
+    samples INT NOT NULL,
+    failures INT NOT NULL,
+    PRIMARY KEY (sensor_id, bucket),
+    INDEX idx_latencies_1h_bucket (bucket)
+);
+
+CREATE TABLE latencies_1d (
+    bucket TIMESTAMP NOT NULL,
+    sensor_id INT NOT NULL,
+    min FLOAT,
+    max FLOAT,
+    avg FLOAT,
+    p95 FLOAT,
+    samples INT NOT NULL,
+    failures INT NOT NULL,
+    PRIMARY KEY (sensor_id, bucket),
+    INDEX idx_latencies_1d_bucket (bucket)
+);
+
+CREATE TABLE rollup_watermarks (
+    name VARCHAR(64) PRIMARY KEY,
+    watermark TIMESTAMP NOT NULL
+);
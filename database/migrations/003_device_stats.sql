@@ -0,0 +1,18 @@
+-- One row per device and sample: utilization is the busy time of disks and the
+-- used space of mounts, in/out are MB/s read/written for disks and Mbps
+-- received/transmitted for network interfaces
+CREATE TABLE device_stats (
+    id INT AUTO_INCREMENT,
+    kind ENUM('disk', 'nic', 'mount') NOT NULL,
+    device VARCHAR(255) NOT NULL,
+    utilization FLOAT,
+    in_rate FLOAT,
+    out_rate FLOAT,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, timestamp),
+    INDEX idx_device_stats_device_timestamp (kind, device, timestamp),
+    INDEX idx_device_stats_timestamp (timestamp)
+)
+PARTITION BY RANGE (UNIX_TIMESTAMP(timestamp)) (
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+);
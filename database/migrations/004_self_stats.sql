@@ -0,0 +1,17 @@
+-- Self-metrics of the monitor, one row per phase or event and save window:
+-- phases store calls, total and max seconds, events store their count
+CREATE TABLE self_stats (
+    id INT AUTO_INCREMENT,
+    job VARCHAR(32) NOT NULL,
+    metric VARCHAR(64) NOT NULL,
+    samples INT NOT NULL,
+    total FLOAT,
+    max FLOAT,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, timestamp),
+    INDEX idx_self_stats_metric_timestamp (metric, timestamp),
+    INDEX idx_self_stats_timestamp (timestamp)
+)
+PARTITION BY RANGE (UNIX_TIMESTAMP(timestamp)) (
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+);
@@ -0,0 +1,53 @@
+-- Identify every sample by the node that collected it, so many nodes can
+-- share one database through the ingest service (scripts/ingest.py)
+
+ALTER TABLE system_stats
+    ADD COLUMN node_id VARCHAR(64) NOT NULL DEFAULT '' AFTER id,
+    ADD INDEX idx_system_stats_node_timestamp (node_id, timestamp);
+
+ALTER TABLE latencies
+    ADD COLUMN node_id VARCHAR(64) NOT NULL DEFAULT '' AFTER id,
+    ADD INDEX idx_latencies_node_sensor_timestamp (node_id, sensor_id, timestamp);
+
+ALTER TABLE device_stats
+    ADD COLUMN node_id VARCHAR(64) NOT NULL DEFAULT '' AFTER id,
+    DROP INDEX idx_device_stats_device_timestamp,
+    ADD INDEX idx_device_stats_device_timestamp (node_id, kind, device, timestamp);
+
+ALTER TABLE self_stats
+    ADD COLUMN node_id VARCHAR(64) NOT NULL DEFAULT '' AFTER id,
+    DROP INDEX idx_self_stats_metric_timestamp,
+    ADD INDEX idx_self_stats_metric_timestamp (node_id, metric, timestamp);
+
+ALTER TABLE system_stats_1m
+    ADD COLUMN node_id VARCHAR(64) NOT NULL DEFAULT '' FIRST,
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (node_id, bucket, metric),
+    ADD INDEX idx_bucket (bucket);
+
+ALTER TABLE system_stats_1h
+    ADD COLUMN node_id VARCHAR(64) NOT NULL DEFAULT '' FIRST,
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (node_id, bucket, metric),
+    ADD INDEX idx_bucket (bucket);
+
+ALTER TABLE system_stats_1d
+    ADD COLUMN node_id VARCHAR(64) NOT NULL DEFAULT '' FIRST,
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (node_id, bucket, metric),
+    ADD INDEX idx_bucket (bucket);
+
+ALTER TABLE latencies_1m
+    ADD COLUMN node_id VARCHAR(64) NOT NULL DEFAULT '' FIRST,
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (node_id, sensor_id, bucket);
+
+ALTER TABLE latencies_1h
+    ADD COLUMN node_id VARCHAR(64) NOT NULL DEFAULT '' FIRST,
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (node_id, sensor_id, bucket);
+
+ALTER TABLE latencies_1d
+    ADD COLUMN node_id VARCHAR(64) NOT NULL DEFAULT '' FIRST,
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (node_id, sensor_id, bucket);
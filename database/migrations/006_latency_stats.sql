@@ -0,0 +1,12 @@
+-- Keep the packet loss and round trip statistics of every ping burst, so a
+-- lossy link can be told apart from a clean one. Rows written before bursts
+-- (or with ping.count = 1) describe a single request.
+
+ALTER TABLE latencies
+    ADD COLUMN packet_loss FLOAT AFTER response_time,
+    ADD COLUMN rtt_min FLOAT AFTER packet_loss,
+    ADD COLUMN rtt_avg FLOAT AFTER rtt_min,
+    ADD COLUMN rtt_max FLOAT AFTER rtt_avg,
+    ADD COLUMN rtt_mdev FLOAT AFTER rtt_max,
+    ADD COLUMN jitter FLOAT AFTER rtt_mdev,
+    ADD COLUMN rtt_p95 FLOAT AFTER jitter;
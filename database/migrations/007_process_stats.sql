@@ -0,0 +1,21 @@
+-- Top processes of every stats sample: one row per ranking (cpu, memory or io)
+-- and position, with the CPU (%), resident memory (MB) and disk IO (MB/s) of
+-- the process. io is NULL for processes whose counters could not be read.
+CREATE TABLE process_stats (
+    id INT AUTO_INCREMENT,
+    node_id VARCHAR(64) NOT NULL DEFAULT '',
+    ranking ENUM('cpu', 'memory', 'io') NOT NULL,
+    position TINYINT NOT NULL,
+    pid INT NOT NULL,
+    name VARCHAR(255),
+    cpu FLOAT,
+    memory FLOAT,
+    io FLOAT,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, timestamp),
+    INDEX idx_process_stats_ranking_timestamp (node_id, ranking, timestamp),
+    INDEX idx_process_stats_timestamp (timestamp)
+)
+PARTITION BY RANGE (UNIX_TIMESTAMP(timestamp)) (
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+);
@@ -0,0 +1,18 @@
+-- Keep the mean packet loss and the 95th percentile of the bursts' p95 in
+-- every latency rollup tier
+
+ALTER TABLE latencies_1m
+    ADD COLUMN packet_loss FLOAT AFTER failures,
+    ADD COLUMN rtt_p95 FLOAT AFTER packet_loss;
+
+ALTER TABLE latencies_1h
+    ADD COLUMN packet_loss FLOAT AFTER failures,
+    ADD COLUMN rtt_p95 FLOAT AFTER packet_loss;
+
+ALTER TABLE latencies_1d
+    ADD COLUMN packet_loss FLOAT AFTER failures,
+    ADD COLUMN rtt_p95 FLOAT AFTER packet_loss;
+
+-- Roll the latencies still in the raw table up again, so their buckets get
+-- the new columns and sub-millisecond sensors stop counting as failures
+DELETE FROM rollup_watermarks WHERE name LIKE 'latencies\_%';
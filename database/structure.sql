@@ -1,5 +1,6 @@
 CREATE TABLE system_stats (
-    id INT AUTO_INCREMENT PRIMARY KEY,
+    id INT AUTO_INCREMENT,
+    node_id VARCHAR(64) NOT NULL DEFAULT '',
     cpu FLOAT,
     cpu_temp FLOAT,
     memory FLOAT,
@@ -20,7 +21,74 @@ CREATE TABLE system_stats (
     disk_wait_count INT DEFAULT 0,
     network_receive_count INT DEFAULT 0,
     network_transmit_count INT DEFAULT 0,
-    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, timestamp),
+    INDEX idx_system_stats_timestamp (timestamp),
+    INDEX idx_system_stats_node_timestamp (node_id, timestamp)
+)
+PARTITION BY RANGE (UNIX_TIMESTAMP(timestamp)) (
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+);
+
+-- One row per device and sample: utilization is the busy time of disks and the
+-- used space of mounts, in/out are MB/s read/written for disks and Mbps
+-- received/transmitted for network interfaces
+CREATE TABLE device_stats (
+    id INT AUTO_INCREMENT,
+    node_id VARCHAR(64) NOT NULL DEFAULT '',
+    kind ENUM('disk', 'nic', 'mount') NOT NULL,
+    device VARCHAR(255) NOT NULL,
+    utilization FLOAT,
+    in_rate FLOAT,
+    out_rate FLOAT,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, timestamp),
+    INDEX idx_device_stats_device_timestamp (node_id, kind, device, timestamp),
+    INDEX idx_device_stats_timestamp (timestamp)
+)
+PARTITION BY RANGE (UNIX_TIMESTAMP(timestamp)) (
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+);
+
+-- Top processes of every stats sample: one row per ranking (cpu, memory or io)
+-- and position, with the CPU (%), resident memory (MB) and disk IO (MB/s) of
+-- the process. io is NULL for processes whose counters could not be read.
+CREATE TABLE process_stats (
+    id INT AUTO_INCREMENT,
+    node_id VARCHAR(64) NOT NULL DEFAULT '',
+    ranking ENUM('cpu', 'memory', 'io') NOT NULL,
+    position TINYINT NOT NULL,
+    pid INT NOT NULL,
+    name VARCHAR(255),
+    cpu FLOAT,
+    memory FLOAT,
+    io FLOAT,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, timestamp),
+    INDEX idx_process_stats_ranking_timestamp (node_id, ranking, timestamp),
+    INDEX idx_process_stats_timestamp (timestamp)
+)
+PARTITION BY RANGE (UNIX_TIMESTAMP(timestamp)) (
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+);
+
+-- Self-metrics of the monitor, one row per phase or event and save window:
+-- phases store calls, total and max seconds, events store their count
+CREATE TABLE self_stats (
+    id INT AUTO_INCREMENT,
+    node_id VARCHAR(64) NOT NULL DEFAULT '',
+    job VARCHAR(32) NOT NULL,
+    metric VARCHAR(64) NOT NULL,
+    samples INT NOT NULL,
+    total FLOAT,
+    max FLOAT,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, timestamp),
+    INDEX idx_self_stats_metric_timestamp (node_id, metric, timestamp),
+    INDEX idx_self_stats_timestamp (timestamp)
+)
+PARTITION BY RANGE (UNIX_TIMESTAMP(timestamp)) (
+    PARTITION pmax VALUES LESS THAN MAXVALUE
 );
 
 CREATE TABLE sensors (
@@ -33,12 +101,121 @@ CREATE TABLE sensors (
     active BOOLEAN DEFAULT FALSE 
 );
 
+-- Partitioned tables cannot have foreign keys, sensor_id references sensors(id)
 CREATE TABLE latencies (
-    id INT AUTO_INCREMENT PRIMARY KEY,
+    id INT AUTO_INCREMENT,
+    node_id VARCHAR(64) NOT NULL DEFAULT '',
     sensor_id INT NOT NULL, 
     response_time FLOAT,
-    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (sensor_id) REFERENCES sensors(id) ON DELETE CASCADE
+    packet_loss FLOAT,
+    rtt_min FLOAT,
+    rtt_avg FLOAT,
+    rtt_max FLOAT,
+    rtt_mdev FLOAT,
+    jitter FLOAT,
+    rtt_p95 FLOAT,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, timestamp),
+    INDEX idx_latencies_sensor_timestamp (sensor_id, timestamp),
+    INDEX idx_latencies_node_sensor_timestamp (node_id, sensor_id, timestamp),
+    INDEX idx_latencies_timestamp (timestamp)
+)
+PARTITION BY RANGE (UNIX_TIMESTAMP(timestamp)) (
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+);
+
+-- Downsampled history, filled incrementally by scripts/rollup.py
+
+CREATE TABLE system_stats_1m (
+    node_id VARCHAR(64) NOT NULL DEFAULT '',
+    bucket TIMESTAMP NOT NULL,
+    metric VARCHAR(32) NOT NULL,
+    min FLOAT,
+    max FLOAT,
+    avg FLOAT,
+    p95 FLOAT,
+    samples INT NOT NULL,
+    PRIMARY KEY (node_id, bucket, metric),
+    INDEX idx_bucket (bucket)
+);
+
+CREATE TABLE system_stats_1h (
+    node_id VARCHAR(64) NOT NULL DEFAULT '',
+    bucket TIMESTAMP NOT NULL,
+    metric VARCHAR(32) NOT NULL,
+    min FLOAT,
+    max FLOAT,
+    avg FLOAT,
+    p95 FLOAT,
+    samples INT NOT NULL,
+    PRIMARY KEY (node_id, bucket, metric),
+    INDEX idx_bucket (bucket)
+);
+
+CREATE TABLE system_stats_1d (
+    node_id VARCHAR(64) NOT NULL DEFAULT '',
+    bucket TIMESTAMP NOT NULL,
+    metric VARCHAR(32) NOT NULL,
+    min FLOAT,
+    max FLOAT,
+    avg FLOAT,
+    p95 FLOAT,
+    samples INT NOT NULL,
+    PRIMARY KEY (node_id, bucket, metric),
+    INDEX idx_bucket (bucket)
+);
+
+CREATE TABLE latencies_1m (
+    node_id VARCHAR(64) NOT NULL DEFAULT '',
+    bucket TIMESTAMP NOT NULL,
+    sensor_id INT NOT NULL,
+    min FLOAT,
+    max FLOAT,
+    avg FLOAT,
+    p95 FLOAT,
+    samples INT NOT NULL,
+    failures INT NOT NULL,
+    packet_loss FLOAT,
+    rtt_p95 FLOAT,
+    PRIMARY KEY (node_id, sensor_id, bucket),
+    INDEX idx_latencies_1m_bucket (bucket)
+);
+
+CREATE TABLE latencies_1h (
+    node_id VARCHAR(64) NOT NULL DEFAULT '',
+    bucket TIMESTAMP NOT NULL,
+    sensor_id INT NOT NULL,
+    min FLOAT,
+    max FLOAT,
+    avg FLOAT,
+    p95 FLOAT,
+    samples INT NOT NULL,
+    failures INT NOT NULL,
+    packet_loss FLOAT,
+    rtt_p95 FLOAT,
+    PRIMARY KEY (node_id, sensor_id, bucket),
+    INDEX idx_latencies_1h_bucket (bucket)
+);
+
+CREATE TABLE latencies_1d (
+    node_id VARCHAR(64) NOT NULL DEFAULT '',
+    bucket TIMESTAMP NOT NULL,
+    sensor_id INT NOT NULL,
+    min FLOAT,
+    max FLOAT,
+    avg FLOAT,
+    p95 FLOAT,
+    samples INT NOT NULL,
+    failures INT NOT NULL,
+    packet_loss FLOAT,
+    rtt_p95 FLOAT,
+    PRIMARY KEY (node_id, sensor_id, bucket),
+    INDEX idx_latencies_1d_bucket (bucket)
+);
+
+CREATE TABLE rollup_watermarks (
+    name VARCHAR(64) PRIMARY KEY,
+    watermark TIMESTAMP NOT NULL
 );
 
 INSERT INTO sensors (name, ip, threshold)
@@ -0,0 +1,130 @@
+import queue
+import threading
+import time
+import traceback
+
+from functions.config import load_config
+from functions.database import connect_db
+from functions.metrics import incr, timed
+from functions.state import update_state
+
+# Alerts are queued by the collectors and written to the whatsapp database by
+# a background thread. Alerts with the same key are sent at most once per
+# cooldown window, and everything queued within the coalesce window is merged
+# into one digest message per channel and title.
+alerts_queue = queue.Queue()
+writer_lock = threading.Lock()
+writer = None
+
+def get_alerts_config():
+    config = load_config()
+    alerts_config = config.get('alerts', {})
+    return alerts_config.get('cooldown', 900), alerts_config.get('coalesce', 1)
+
+# Function to queue an alert. The key identifies what the alert is about
+# (e.g. node and sensor) for deduplication, None means always send it.
+def send_alert(channel, title, line, key=None):
+    start_writer()
+    alerts_queue.put((channel, title, line, key))
+
+# Wait until every queued alert has been written
+def flush_alerts():
+    alerts_queue.join()
+
+def start_writer():
+    global writer
+    with writer_lock:
+        if writer is None:
+            writer = threading.Thread(target=run_writer, name='alerts', daemon=True)
+            writer.start()
+
+# Drop the alerts whose key was already sent within the cooldown window. The
+# cooldowns are shared with the other jobs through the state file, so they
+# are read and reserved (set to now) in one locked step.
+def deduplicate(alerts, cooldown, now):
+    pending = []
+
+    def update(last_sent):
+        last_sent = dict(last_sent)
+        pending.clear()
+        for alert in alerts:
+            key = alert[3]
+            if key is not None:
+                if now - last_sent.get(key, 0) < cooldown:
+                    continue
+                last_sent[key] = now
+            pending.append(alert)
+
+        # Forget keys whose cooldown already expired, so the state stays small
+        return {key: sent for key, sent in last_sent.items() if now - sent < cooldown}
+
+    update_state('alerts', update, {})
+    incr('alerts_suppressed', len(alerts) - len(pending))
+    return pending
+
+# Give back the keys deduplicate() reserved at `now` for alerts that were not
+# sent, so the next alert with the same key is not suppressed
+def release_keys(alerts, now):
+    keys = {alert[3] for alert in alerts if alert[3] is not None}
+    update_state('alerts', lambda last_sent: {key: sent for key, sent in last_sent.items() if key not in keys or sent != now}, {})
+
+# Merge the alerts of each channel and title into a single message
+def build_digests(alerts):
+    digests = {}
+    for channel, title, line, _ in alerts:
+        digests.setdefault((channel, title), []).append(line)
+
+    return [(channel, f"{title} \n\n" + "\n".join(lines)) for (channel, title), lines in digests.items()]
+
+@timed('alerts.dispatch')
+def insert_messages(messages):
+    connection = connect_db('whatsapp')  # Connect to the WhatsApp DB
+    cursor = connection.cursor()
+    try:
+        placeholders = ", ".join(["(%s, %s)"] * len(messages))
+        cursor.execute(f"""
+            INSERT INTO messages (phone, message)
+            VALUES {placeholders}
+        """, [value for message in messages for value in message])
+        connection.commit()
+    finally:
+        cursor.close()
+        connection.close()
+
+# Function to send a batch of queued alerts as digests
+def dispatch(alerts, cooldown):
+    now = time.time()
+    pending = deduplicate(alerts, cooldown, now)
+    messages = build_digests(pending)
+    if not messages:
+        return
+
+    try:
+        insert_messages(messages)
+    except Exception:
+        release_keys(pending, now)
+        raise
+    incr('alerts_sent', len(messages))
+
+def run_writer():
+    while True:
+        alerts = [alerts_queue.get()]
+        cooldown, coalesce = get_alerts_config()
+
+        # Give the rest of the cycle a moment to queue its alerts too
+        deadline = time.monotonic() + coalesce
+        while True:
+            try:
+                alerts.append(alerts_queue.get(timeout=max(0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+
+        try:
+            dispatch(alerts, cooldown)
+        except Exception:
+            incr('alerts_failed', len(alerts))
+            print("\033[31mCould not send alerts\033[0m")
+            traceback.print_exc()
+        finally:
+            for _ in alerts:
+                alerts_queue.task_done()
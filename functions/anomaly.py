@@ -0,0 +1,162 @@
+import threading
+import warnings
+import zipfile
+import numpy as np
+
+# Anomaly detection over the recent history of every metric or sensor. Each
+# group (e.g. "stats" or "latency") keeps a ring buffer with one row per series
+# and evaluates its rules for all series at once with NumPy.
+#
+# A rule is a dict like {"type": "zscore", "window": 30, "above": 3} where type is
+#   min         every sample of the window is above the limit (sustained breach)
+#   mean        rolling mean of the window is above the limit
+#   ewma        exponentially weighted mean (alpha, default 0.3) is above the limit
+#   percentile  the q-th percentile (default 95) of the window is above the limit
+#   zscore      the latest sample is more than `above` stddevs over the window mean,
+#               with the stddev taken as at least min_stddev (default 0); a flat
+#               window with no min_stddev never triggers
+#   rate        the latest sample grew more than `above` per sample over the window
+# "above" may be a number or "threshold" to use each series' own threshold.
+
+STATE_FILE = 'anomaly-{name}.npz'
+
+class RingBuffer:
+    def __init__(self, keys=(), capacity=60):
+        self.capacity = capacity
+        self.keys = list(keys)
+        self.index = {key: row for row, key in enumerate(self.keys)}
+        self.data = np.full((len(self.keys), capacity), np.nan)
+        self.counts = np.zeros(len(self.keys), dtype=np.int64)
+        self.position = 0
+
+    # Make sure every key has a row, new series start with an empty history
+    def add_keys(self, keys):
+        new_keys = [key for key in keys if key not in self.index]
+        if not new_keys:
+            return
+
+        for key in new_keys:
+            self.index[key] = len(self.keys)
+            self.keys.append(key)
+        self.data = np.vstack([self.data, np.full((len(new_keys), self.capacity), np.nan)])
+        self.counts = np.concatenate([self.counts, np.zeros(len(new_keys), dtype=np.int64)])
+
+    # Store one sample per key, series without a value this tick get NaN
+    def push(self, values):
+        self.add_keys(values)
+        column = np.full(len(self.keys), np.nan)
+        rows = np.fromiter((self.index[key] for key in values), dtype=np.int64, count=len(values))
+        column[rows] = np.fromiter((np.nan if value is None else value for value in values.values()), dtype=float, count=len(values))
+
+        self.data[:, self.position] = column
+        self.counts[rows] += 1
+        self.position = (self.position + 1) % self.capacity
+
+    # Last `window` samples of every series, oldest first
+    def window(self, window):
+        window = min(window, self.capacity)
+        columns = (self.position - window + np.arange(window)) % self.capacity
+        return self.data[:, columns]
+
+    def save(self, path):
+        np.savez(path, keys=np.array([str(key) for key in self.keys]), data=self.data,
+                 counts=self.counts, position=self.position)
+
+    @classmethod
+    def load(cls, path, capacity):
+        with np.load(path) as saved:
+            buffer = cls(capacity=saved['data'].shape[1])
+            buffer.keys = [str(key) for key in saved['keys']]
+            buffer.index = {key: row for row, key in enumerate(buffer.keys)}
+            buffer.data = saved['data']
+            buffer.counts = saved['counts']
+            buffer.position = int(saved['position'])
+
+        # A different capacity in config.json starts the history over
+        return buffer if buffer.capacity == capacity else cls(buffer.keys, capacity)
+
+# Buffers live in memory for the daemon and in a file between cron runs
+buffers = {}
+buffers_lock = threading.Lock()
+
+def get_buffer(name, capacity):
+    if name not in buffers:
+        try:
+            buffers[name] = RingBuffer.load(STATE_FILE.format(name=name), capacity)
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+            buffers[name] = RingBuffer(capacity=capacity)
+    return buffers[name]
+
+# Evaluate one rule for all series, returning a boolean array and the
+# value each series was compared with
+def evaluate_rule(buffer, rule, limits):
+    window = rule.get('window', 6)
+    samples = buffer.window(window)
+    latest = samples[:, -1]
+
+    # Series with no samples in the window give NaN, which never triggers
+    with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        if rule['type'] == 'min':
+            value = np.min(samples, axis=1)  # NaN if any sample is missing
+        elif rule['type'] == 'mean':
+            value = np.nanmean(samples, axis=1)
+        elif rule['type'] == 'ewma':
+            alpha = rule.get('alpha', 0.3)
+            weights = (1 - alpha) ** np.arange(samples.shape[1] - 1, -1, -1)
+            present = ~np.isnan(samples)
+            value = np.nansum(samples * weights, axis=1) / np.sum(present * weights, axis=1)
+        elif rule['type'] == 'percentile':
+            value = np.nanpercentile(samples, rule.get('q', 95), axis=1)
+        elif rule['type'] == 'zscore':
+            history = samples[:, :-1]
+            stddev = np.maximum(np.nanstd(history, axis=1), rule.get('min_stddev', 0))
+            value = np.where(stddev > 0, (latest - np.nanmean(history, axis=1)) / stddev, np.nan)
+        elif rule['type'] == 'rate':
+            value = (latest - samples[:, 0]) / (samples.shape[1] - 1)
+        else:
+            raise ValueError(f"Unknown anomaly rule: {rule['type']}")
+
+        # Only series with a full window and a current sample can trigger
+        triggered = (value > limits) & (buffer.counts >= window) & ~np.isnan(latest)
+
+    return triggered, value
+
+# Function to add the latest sample of every series to a group's history and
+# evaluate its rules in one batched pass.
+#   values: {key: latest value}
+#   rules: {key: [rule, ...]}
+#   thresholds: {key: threshold} used by rules with "above": "threshold"
+# Keys are compared as strings, so they survive being saved between runs.
+# Returns a list of (key, rule, value) for every rule that triggered.
+def detect_anomalies(name, values, rules, thresholds=None, capacity=60, persist=True):
+    values = {str(key): value for key, value in values.items()}
+    rules = {str(key): key_rules for key, key_rules in rules.items()}
+    thresholds = {str(key): threshold for key, threshold in (thresholds or {}).items()}
+
+    with buffers_lock:
+        buffer = get_buffer(name, capacity)
+        buffer.push(values)
+
+        # Group identical rules so each one is computed once for all its series
+        groups = {}
+        for key, key_rules in rules.items():
+            for rule in key_rules:
+                groups.setdefault(tuple(sorted(rule.items())), []).append(key)
+
+        anomalies = []
+        for rule_items, keys in groups.items():
+            rule = dict(rule_items)
+            limits = np.full(len(buffer.keys), np.inf)
+            for key in keys:
+                if key in buffer.index:
+                    above = rule.get('above', 'threshold')
+                    limits[buffer.index[key]] = thresholds.get(key, np.inf) if above == 'threshold' else above
+
+            triggered, value = evaluate_rule(buffer, rule, limits)
+            anomalies += [(buffer.keys[row], rule, float(value[row])) for row in np.flatnonzero(triggered)]
+
+        if persist:
+            buffer.save(STATE_FILE.format(name=name))
+
+    return anomalies
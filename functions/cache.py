@@ -0,0 +1,93 @@
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+# Thread-safe LRU cache whose entries also expire after a TTL. Every entry
+# remembers the end of the time range it covers, so new samples only
+# invalidate the entries that could contain them. Only one caller at a time
+# loads a missing key, the others wait for its result.
+class RangeCache:
+    def __init__(self, size=1024, ttl=300):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expires, kind, range end, value)
+        self.loading = {}  # key -> [done event, kind, range end, invalidated]
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # Look a key up with the lock held, MISSING if it is not cached
+    def lookup(self, key):
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self.entries.pop(key, None)
+            return MISSING
+        self.entries.move_to_end(key)
+        return entry[3]
+
+    def get(self, key):
+        with self.lock:
+            value = self.lookup(key)
+            if value is MISSING:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return value
+
+    # Store a value with the lock held, evicting the least recently used entries
+    def store(self, key, value, kind, end):
+        self.entries[key] = (time.monotonic() + self.ttl, kind, end, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def set(self, key, value, kind, end):
+        with self.lock:
+            self.store(key, value, kind, end)
+
+    # Drop the entries of a kind whose range reaches past a timestamp, they may
+    # be missing samples that arrived after it. None ends mean "up to now".
+    def invalidate_after(self, kind, timestamp):
+        with self.lock:
+            stale = [key for key, (_, entry_kind, end, _) in self.entries.items()
+                     if entry_kind == kind and (end is None or end > timestamp)]
+            for key in stale:
+                del self.entries[key]
+
+            # Loads in progress may have read the table before those samples
+            for loading in self.loading.values():
+                if loading[1] == kind and (loading[2] is None or loading[2] > timestamp):
+                    loading[3] = True
+            return len(stale)
+
+    # Get a value, computing and caching it on a miss. Callers missing the same
+    # key while it is being loaded wait for that load instead of running it too.
+    def get_or_load(self, key, kind, end, load):
+        while True:
+            with self.lock:
+                value = self.lookup(key)
+                if value is not MISSING:
+                    self.hits += 1
+                    return value
+
+                loading = self.loading.get(key)
+                if loading is None:
+                    loading = self.loading[key] = [threading.Event(), kind, end, False]
+                    self.misses += 1
+                    break
+
+            # Cached by now, unless the load failed or was invalidated
+            loading[0].wait()
+
+        try:
+            value = load()
+            with self.lock:
+                if not loading[3]:
+                    self.store(key, value, kind, end)
+            return value
+        finally:
+            with self.lock:
+                del self.loading[key]
+            loading[0].set()
@@ -0,0 +1,20 @@
+import json
+import os
+import threading
+
+CONFIG_FILE = 'config.json'
+
+# Parsed configuration, reloaded only when the file's mtime changes
+cache = {'mtime': None, 'config': None}
+cache_lock = threading.Lock()
+
+# Load configuration from the JSON file
+def load_config():
+    mtime = os.stat(CONFIG_FILE).st_mtime_ns
+
+    with cache_lock:
+        if cache['mtime'] != mtime:
+            with open(CONFIG_FILE) as f:
+                cache['config'] = json.load(f)
+            cache['mtime'] = mtime
+        return cache['config']
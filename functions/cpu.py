@@ -1,10 +1,6 @@
 import psutil
 
 # Functions to collect system information
-def get_cpu_usage():
-    cpu_total = psutil.cpu_percent(interval=1)
-    return cpu_total
-
 def get_cpu_temp():
     try:
         temps = psutil.sensors_temperatures()
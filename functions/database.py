@@ -0,0 +1,97 @@
+import threading
+import time
+
+from functions.config import load_config
+from functions.metrics import incr, timed
+
+# One connection pool per database, shared by every helper in the process
+pools = {}
+pools_lock = threading.Lock()
+
+# mysql.connector is imported on first use, so runs that never reach the
+# database (e.g. nodes forwarding to an ingest server) do not pay for it
+def get_connector():
+    import mysql.connector
+    import mysql.connector.pooling
+    return mysql.connector
+
+# Create the pool for a database the first time it is needed
+def get_pool(database):
+    with pools_lock:
+        if database not in pools:
+            config = load_config()
+            db_config = config['databases'][database]
+            connector = get_connector()
+
+            pools[database] = connector.pooling.MySQLConnectionPool(
+                pool_name=database,
+                pool_size=db_config.get('pool_size', 5),
+                pool_reset_session=True,
+                host=db_config['host'],
+                user=db_config['user'],
+                password=db_config['password'],
+                database=db_config['database'],
+                charset=db_config.get('charset', 'utf8mb4'),  # Default charset if not provided
+                collation=db_config.get('collation', 'utf8mb4_unicode_ci'),  # Default collation if not provided
+                use_pure=db_config.get('use_pure', not connector.HAVE_CEXT)  # Prefer the C extension when installed
+            )
+        return pools[database]
+
+# Cursor that counts and times every query sent through it
+class MeteredCursor:
+    def __init__(self, cursor, database):
+        self.cursor = cursor
+        self.database = database
+
+    def execute(self, *args, **kwargs):
+        incr(f"db_queries.{self.database}")
+        with timed(f"db.{self.database}"):
+            return self.cursor.execute(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+class MeteredConnection:
+    def __init__(self, connection, database):
+        self.connection = connection
+        self.database = database
+
+    def cursor(self, *args, **kwargs):
+        return MeteredCursor(self.connection.cursor(*args, **kwargs), self.database)
+
+    def commit(self):
+        incr(f"db_commits.{self.database}")
+        return self.connection.commit()
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+# General function to get a connection to the MySQL database from its pool.
+# Closing the returned connection hands it back to the pool instead of
+# tearing down the TCP session, so the next helper skips the handshake.
+def connect_db(database, wait=10):
+    pool = get_pool(database)
+    connector = get_connector()
+    deadline = time.monotonic() + wait
+
+    while True:
+        try:
+            connection = pool.get_connection()
+            break
+        except connector.pooling.PoolError:
+            # Every connection is in use by another thread, wait for one to come back
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.05)
+
+    # Health check: the pool only reconnects sessions it knows are closed,
+    # so make sure an idle connection the server dropped is usable again
+    try:
+        connection.ping(reconnect=True, attempts=3, delay=1)
+    except connector.Error:
+        incr(f"db_errors.{database}")
+        connection.close()
+        raise
+
+    incr(f"db_connections.{database}")
+    return MeteredConnection(connection, database)
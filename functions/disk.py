@@ -1,20 +1,42 @@
 import psutil
-import time
+from array import array
+
+from functions.samples import DeviceSamples
+
+# Devices that are never worth reporting on their own
+IGNORED_DISKS = ('loop', 'ram', 'zram')
 
 def get_disk_usage():
     disk = psutil.disk_usage('/')
     disk_used_percentage = disk.percent  # Get the percentage of disk used directly from psutil
     return disk_used_percentage
 
-def get_disk_io():
-    previous_disk = psutil.disk_io_counters()
-    time.sleep(1)
-    current_disk = psutil.disk_io_counters()
-    disk_read = (current_disk.read_bytes - previous_disk.read_bytes) / (1024**2)  # Convert to MB/s
-    disk_write = (current_disk.write_bytes - previous_disk.write_bytes) / (1024**2)  # Convert to MB/s
-    return disk_read, disk_write
-
-# Function to get disk IO wait time
-def get_disk_wait():
-    cpu_times = psutil.cpu_times_percent(interval=1)
-    return cpu_times.iowait
\ No newline at end of file
+# Function to get the used percentage of every mounted filesystem
+def get_disk_usage_all():
+    mountpoints = []
+    usages = []
+    for partition in psutil.disk_partitions(all=False):
+        try:
+            usages.append(psutil.disk_usage(partition.mountpoint).percent)
+        except (PermissionError, OSError):
+            continue  # Unreadable or vanished mount
+        mountpoints.append(partition.mountpoint)
+
+    samples = DeviceSamples('mount', mountpoints)
+    samples.utilization = array('d', usages)
+    return samples
+
+# Function to compute per-disk throughput (MB/s) and busy time (%) between two
+# psutil.disk_io_counters(perdisk=True) readings taken elapsed seconds apart
+def get_disk_io_per_device(previous, current, elapsed):
+    names = [name for name in current if name in previous and not name.startswith(IGNORED_DISKS)]
+    samples = DeviceSamples('disk', names)
+
+    for index, name in enumerate(names):
+        before, after = previous[name], current[name]
+        samples.in_rate[index] = (after.read_bytes - before.read_bytes) / elapsed / (1024**2)  # Convert to MB/s
+        samples.out_rate[index] = (after.write_bytes - before.write_bytes) / elapsed / (1024**2)  # Convert to MB/s
+        if hasattr(after, 'busy_time'):
+            samples.utilization[index] = min(100.0, (after.busy_time - before.busy_time) / (elapsed * 1000) * 100)
+
+    return samples
@@ -0,0 +1,282 @@
+import math
+import os
+import queue
+import socket
+import struct
+import select
+import threading
+import time
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+
+# Compute the internet checksum of an ICMP packet
+def checksum(data):
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack('!%dH' % (len(data) // 2), data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+# Build an ICMP echo request with the given identifier and sequence number
+def build_echo_request(identifier, sequence, payload=b'system-monitoring'):
+    header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0, identifier, sequence)
+    csum = checksum(header + payload)
+    header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, csum, identifier, sequence)
+    return header + payload
+
+# Parse an echo reply and return (identifier, sequence) or None if it is not one
+def parse_echo_reply(packet):
+    # Raw sockets deliver the IPv4 header too, datagram ICMP sockets do not
+    if packet and packet[0] >> 4 == 4:
+        packet = packet[(packet[0] & 0x0F) * 4:]
+
+    if len(packet) < 8:
+        return None
+
+    icmp_type, code, _, identifier, sequence = struct.unpack('!BBHHH', packet[:8])
+    if icmp_type != ICMP_ECHO_REPLY or code != 0:
+        return None
+
+    return identifier, sequence
+
+# Open an ICMP socket, preferring unprivileged datagram sockets over raw ones
+def open_icmp_socket():
+    try:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+        # The kernel rewrites the identifier of datagram ICMP sockets
+        rewrites_id = True
+    except PermissionError:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+        rewrites_id = False
+
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024 * 1024)
+    return sock, rewrites_id
+
+# Resolve every host name concurrently, unresolvable hosts map to None.
+# With a timeout, hosts still resolving when it expires map to None too and
+# their lookups finish in the background, so a slow resolver can not hold up
+# the sweep (or the exit of the process, the workers are daemon threads).
+def resolve_hosts(hosts, workers=32, timeout=None):
+    hosts = list(hosts)
+    results = {host: None for host in hosts}
+    if not hosts:
+        return results
+
+    pending = queue.Queue()
+    for host in hosts:
+        pending.put(host)
+    resolved = {}
+    lock = threading.Lock()
+    finished = threading.Event()
+
+    def resolve():
+        while True:
+            try:
+                host = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                address = socket.gethostbyname(host)
+            except (socket.gaierror, UnicodeError):
+                address = None
+            with lock:
+                resolved[host] = address
+                if len(resolved) == len(hosts):
+                    finished.set()
+
+    for _ in range(min(workers, len(hosts))):
+        threading.Thread(target=resolve, name='resolver', daemon=True).start()
+
+    finished.wait(timeout)
+    with lock:
+        results.update(resolved)
+    return results
+
+# Requests sent through one socket: each one takes its own 16 bit sequence
+# number, so bigger sweeps are spread over several sockets
+MAX_REQUESTS_PER_SOCKET = 65535
+
+# Split the plans into groups of at most MAX_REQUESTS_PER_SOCKET requests
+def split_plans(plans):
+    groups = [{}]
+    requests = 0
+    for key, plan in plans.items():
+        if requests + plan[2] > MAX_REQUESTS_PER_SOCKET and groups[-1]:
+            groups.append({})
+            requests = 0
+        groups[-1][key] = plan
+        requests += plan[2]
+    return groups
+
+# Send ICMP echo requests to all targets at once and wait for their replies.
+# plans maps a key to [address, interval, requests, deadline, replies needed]:
+# the requests of a host are sent `interval` seconds apart and the host is done
+# once it got the replies it needs or its deadline passed. open_socket returns
+# (socket, whether the kernel rewrites the identifier), tests pass a UDP one.
+# Returns a dict key -> list with the round trip time in ms of every request,
+# in the order they were sent, None for the ones that were lost.
+def run_probes(plans, open_socket=open_icmp_socket, port=0):
+    results = {key: [None] * plan[2] for key, plan in plans.items()}
+    start = time.monotonic()
+
+    # One socket per group of hosts, each with its own identifier and sequence numbers
+    groups = []
+    base_identifier = (os.getpid() ^ id(results)) & 0xFFFF
+    try:
+        for number, group_plans in enumerate(split_plans(plans)):
+            hosts = {}  # key -> [address, interval, requests sent, requests, next send, deadline, replies left]
+            for key, (address, interval, requests, deadline, needed) in group_plans.items():
+                if address is not None:
+                    hosts[key] = [address, interval, 0, requests, start, start + deadline, needed]
+            if not hosts:
+                continue
+
+            sock, rewrites_id = open_socket()
+            sock.setblocking(False)
+            groups.append({
+                'socket': sock,
+                'rewrites_id': rewrites_id,
+                'identifier': (base_identifier + number) & 0xFFFF,
+                'sequence': 0,
+                'in_flight': {},  # sequence -> (key, request number, send time)
+                'hosts': hosts,
+            })
+
+        while any(group['hosts'] for group in groups):
+            now = time.monotonic()
+
+            # Send every request that is due, dropping hosts whose budget is spent
+            for group in groups:
+                hosts = group['hosts']
+                for key, state in list(hosts.items()):
+                    address, interval, sent, requests, next_send, deadline, _ = state
+                    if now >= deadline:
+                        del hosts[key]
+                        continue
+                    if sent == requests or now < next_send:
+                        continue
+
+                    sequence = (group['sequence'] + 1) & 0xFFFF
+                    try:
+                        group['socket'].sendto(build_echo_request(group['identifier'], sequence), (address, port))
+                    except BlockingIOError:
+                        break  # The send buffer is full, retry on the next pass
+                    except OSError:
+                        del hosts[key]  # Unreachable network, count it as lost
+                        continue
+
+                    group['sequence'] = sequence
+                    group['in_flight'][sequence] = (key, sent, time.monotonic())
+                    state[2] = sent + 1
+                    state[4] = now + interval
+
+            active = [group for group in groups if group['hosts']]
+            if not active:
+                break
+
+            wake_up = min(
+                min(state[4] if state[2] < state[3] else state[5], state[5])
+                for group in active for state in group['hosts'].values()
+            )
+            readable, _, _ = select.select([group['socket'] for group in active], [], [], max(0.0, wake_up - time.monotonic()))
+
+            for group in active:
+                if group['socket'] not in readable:
+                    continue
+                hosts = group['hosts']
+
+                # Drain every reply that is already waiting
+                while True:
+                    try:
+                        packet, source = group['socket'].recvfrom(2048)
+                    except (BlockingIOError, InterruptedError):
+                        break
+
+                    received = time.monotonic()
+                    reply = parse_echo_reply(packet)
+                    if reply is None:
+                        continue
+
+                    reply_id, reply_sequence = reply
+                    if not group['rewrites_id'] and reply_id != group['identifier']:
+                        continue  # Reply to some other process or socket on a raw socket
+
+                    sent = group['in_flight'].pop(reply_sequence, None)
+                    if sent is None:
+                        continue
+
+                    key, request, sent_at = sent
+                    if key not in hosts or hosts[key][0] != source[0]:
+                        continue  # Late duplicate or spoofed source
+
+                    results[key][request] = (received - sent_at) * 1000
+                    hosts[key][6] -= 1
+                    if hosts[key][6] == 0:
+                        del hosts[key]
+    finally:
+        for group in groups:
+            group['socket'].close()
+
+    return results
+
+# Probe every target until it answers once. targets is a list of (key, address)
+# pairs, budgets optionally maps a key to its own (timeout, attempts). Retries
+# of a host are spread evenly over its timeout, so the whole sweep lasts about
+# one timeout interval.
+# Returns a dict key -> round trip time in ms, or None if the host never answered.
+def probe_hosts(targets, timeout=4, attempts=4, budgets=None, open_socket=open_icmp_socket, port=0):
+    budgets = budgets or {}
+    plans = {}
+    for key, address in targets:
+        host_timeout, host_attempts = budgets.get(key, (timeout, attempts))
+        plans[key] = [address, host_timeout / host_attempts, host_attempts, host_timeout, 1]
+
+    results = run_probes(plans, open_socket, port)
+    return {key: next((rtt for rtt in rtts if rtt is not None), None) for key, rtts in results.items()}
+
+# Send a burst of `count` echo requests to every target, `spacing` seconds
+# apart, and wait up to `timeout` seconds for all of them. Bursts to every
+# host overlap, so the sweep still lasts at most one timeout interval.
+# Returns a dict key -> list of round trip times in ms, None for lost requests.
+def probe_bursts(targets, count=5, timeout=4, spacing=0.02, open_socket=open_icmp_socket, port=0):
+    plans = {key: [address, spacing, count, timeout, count] for key, address in targets}
+    return run_probes(plans, open_socket, port)
+
+# Summarize one burst in a single pass: packet loss in percent, min/avg/max and
+# mean deviation of the round trip times (like ping's mdev), jitter as the mean
+# difference between consecutive replies (RFC 3550) and the 95th percentile.
+# Every statistic is None if nothing came back.
+def summarize_rtts(rtts):
+    received = 0
+    total = squares = jitter = 0.0
+    low = high = previous = None
+    for rtt in rtts:
+        if rtt is None:
+            continue
+        received += 1
+        total += rtt
+        squares += rtt * rtt
+        low = rtt if low is None or rtt < low else low
+        high = rtt if high is None or rtt > high else high
+        if previous is not None:
+            jitter += abs(rtt - previous)
+        previous = rtt
+
+    summary = {'packet_loss': 100.0 * (len(rtts) - received) / len(rtts) if rtts else 100.0}
+    if not received:
+        return {**summary, 'rtt_min': None, 'rtt_avg': None, 'rtt_max': None,
+                'rtt_mdev': None, 'jitter': None, 'rtt_p95': None}
+
+    average = total / received
+    ordered = sorted(rtt for rtt in rtts if rtt is not None)
+    return {
+        **summary,
+        'rtt_min': low,
+        'rtt_avg': average,
+        'rtt_max': high,
+        'rtt_mdev': math.sqrt(max(0.0, squares / received - average * average)),
+        'jitter': jitter / (received - 1) if received > 1 else 0.0,
+        'rtt_p95': ordered[max(0, math.ceil(0.95 * received) - 1)],
+    }
@@ -0,0 +1,130 @@
+import hmac
+import json
+import socket
+import struct
+import threading
+import zlib
+
+from functions.config import load_config
+
+# Wire format between the nodes and the central ingest service: every frame
+# is a 4-byte big-endian length followed by a zlib-compressed JSON document.
+# A node sends {"token", "node", "table", "columns", "rows"} and the server
+# answers {"ok": true} once the rows are committed, or {"ok": false, "error"}.
+
+MAX_FRAME = 16 * 1024 * 1024
+
+# Tables and columns a node may write, anything else is rejected by the server
+TABLES = {
+    'system_stats': (
+        'node_id', 'cpu', 'cpu_temp', 'memory', 'swap', 'disk', 'disk_read', 'disk_write',
+        'disk_wait', 'network_receive', 'network_transmit',
+        'cpu_count', 'cpu_temp_count', 'memory_count', 'swap_count', 'disk_count',
+        'disk_read_count', 'disk_write_count', 'disk_wait_count',
+        'network_receive_count', 'network_transmit_count', 'timestamp',
+    ),
+    'latencies': ('node_id', 'sensor_id', 'response_time', 'packet_loss', 'rtt_min', 'rtt_avg', 'rtt_max',
+                  'rtt_mdev', 'jitter', 'rtt_p95', 'timestamp'),
+    'device_stats': ('node_id', 'kind', 'device', 'utilization', 'in_rate', 'out_rate', 'timestamp'),
+    'process_stats': ('node_id', 'ranking', 'position', 'pid', 'name', 'cpu', 'memory', 'io', 'timestamp'),
+    'self_stats': ('node_id', 'job', 'metric', 'samples', 'total', 'max', 'timestamp'),
+}
+
+class IngestError(Exception):
+    pass
+
+def encode_frame(document):
+    payload = zlib.compress(json.dumps(document).encode())
+    return struct.pack('!I', len(payload)) + payload
+
+def read_exactly(sock, size):
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed in the middle of a frame")
+        data += chunk
+    return data
+
+# Read one frame, None if the peer closed the connection between frames
+def read_frame(sock, max_frame=MAX_FRAME):
+    header = sock.recv(4)
+    if not header:
+        return None
+    header += read_exactly(sock, 4 - len(header))
+
+    (size,) = struct.unpack('!I', header)
+    if size > max_frame:
+        raise IngestError(f"Frame of {size} bytes is over the {max_frame} bytes limit")
+
+    # Bound the decompressed size too, a small frame could expand a lot
+    decompressor = zlib.decompressobj()
+    document = decompressor.decompress(read_exactly(sock, size), max_frame)
+    if decompressor.unconsumed_tail:
+        raise IngestError(f"Frame expands over the {max_frame} bytes limit")
+    return json.loads(document)
+
+# Check a batch received from a node before it gets near the database
+def validate_batch(document, token):
+    if not hmac.compare_digest(str(document.get('token', '')), token):
+        raise IngestError("Invalid token")
+
+    table, columns, rows = document.get('table'), document.get('columns'), document.get('rows')
+    if table not in TABLES:
+        raise IngestError(f"Unknown table: {table}")
+    if not isinstance(columns, list) or not columns or not set(columns) <= set(TABLES[table]):
+        raise IngestError(f"Unknown columns for {table}")
+    if not isinstance(rows, list) or not all(isinstance(row, list) and len(row) == len(columns) for row in rows):
+        raise IngestError("Malformed rows")
+
+    return table, columns, rows
+
+# One persistent connection per process to the ingest service
+connection = {'socket': None}
+connection_lock = threading.Lock()
+
+def get_ingest_config():
+    config = load_config()
+    return config.get('ingest', {})
+
+# Nodes with an ingest server ship their samples there, and the central
+# service writes them and applies retention for the whole fleet
+def forwards_to_ingest():
+    return bool(get_ingest_config().get('server'))
+
+def parse_address(address):
+    host, port = address.rsplit(':', 1)
+    return host, int(port)
+
+# Function to send a batch of rows to the ingest service, usable as the
+# spool's writer. Raises if the batch was not acknowledged, so the spool keeps it.
+def send_batch(table, columns, rows):
+    ingest_config = get_ingest_config()
+    document = {
+        'token': ingest_config.get('token', ''),
+        'node': load_config().get('node', ''),
+        'table': table,
+        'columns': list(columns),
+        'rows': [[row[column] for column in columns] for row in rows],
+    }
+
+    with connection_lock:
+        try:
+            if connection['socket'] is None:
+                connection['socket'] = socket.create_connection(parse_address(ingest_config['server']), timeout=ingest_config.get('timeout', 30))
+            connection['socket'].sendall(encode_frame(document))
+            reply = read_frame(connection['socket'])
+        except (OSError, ValueError, IngestError):
+            close_connection()
+            raise
+
+        if reply is None:
+            close_connection()
+            raise ConnectionError("The ingest service closed the connection")
+        if not reply.get('ok'):
+            raise IngestError(reply.get('error', 'Batch rejected'))
+
+def close_connection():
+    if connection['socket'] is not None:
+        connection['socket'].close()
+        connection['socket'] = None
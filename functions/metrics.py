@@ -0,0 +1,133 @@
+import os
+import threading
+import time
+import traceback
+from contextlib import ContextDecorator
+from datetime import datetime
+
+from functions.config import load_config
+
+# Self-metrics of the monitor: how long each phase takes and how often things
+# like DB queries, probe timeouts or cycle overruns happen. They are written
+# as a Prometheus text file and saved to the self_stats table.
+durations = {}  # phase -> [calls, total seconds, max seconds]
+counters = {}  # event -> count
+metrics_lock = threading.Lock()
+last_saved = {}
+
+def incr(event, amount=1):
+    with metrics_lock:
+        counters[event] = counters.get(event, 0) + amount
+
+def record_duration(phase, seconds):
+    with metrics_lock:
+        calls, total, longest = durations.get(phase, (0, 0.0, 0.0))
+        durations[phase] = [calls + 1, total + seconds, max(longest, seconds)]
+
+# Time a block or a function as a phase: `with timed('ping.sweep'):` or `@timed('ping.sweep')`
+class timed(ContextDecorator):
+    def __init__(self, phase):
+        self.phase = phase
+
+    # Each call of a decorated function gets its own timer, so calls from
+    # several threads do not overwrite each other's start time
+    def _recreate_cm(self):
+        return timed(self.phase)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record_duration(self.phase, time.perf_counter() - self.start)
+        return False
+
+def render_prometheus():
+    with metrics_lock:
+        phases = {phase: list(values) for phase, values in durations.items()}
+        events = dict(counters)
+
+    lines = [
+        "# TYPE system_monitoring_phase_calls_total counter",
+        *(f'system_monitoring_phase_calls_total{{phase="{phase}"}} {values[0]}' for phase, values in sorted(phases.items())),
+        "# TYPE system_monitoring_phase_seconds_total counter",
+        *(f'system_monitoring_phase_seconds_total{{phase="{phase}"}} {values[1]:.6f}' for phase, values in sorted(phases.items())),
+        "# TYPE system_monitoring_phase_seconds_max gauge",
+        *(f'system_monitoring_phase_seconds_max{{phase="{phase}"}} {values[2]:.6f}' for phase, values in sorted(phases.items())),
+        "# TYPE system_monitoring_events_total counter",
+        *(f'system_monitoring_events_total{{event="{event}"}} {count}' for event, count in sorted(events.items())),
+    ]
+    return "\n".join(lines) + "\n"
+
+# Rows for the self_stats table with what happened since the last save
+def self_stats_rows(job):
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    rows = []
+
+    with metrics_lock:
+        for phase, (calls, total, longest) in durations.items():
+            previous_calls, previous_total = last_saved.get(('phase', phase), (0, 0.0))
+            if calls > previous_calls:
+                rows.append({'job': job, 'metric': phase, 'samples': calls - previous_calls,
+                             'total': total - previous_total, 'max': longest, 'timestamp': timestamp})
+            last_saved[('phase', phase)] = (calls, total)
+
+        for event, count in counters.items():
+            previous_count = last_saved.get(('event', event), 0)
+            if count > previous_count:
+                rows.append({'job': job, 'metric': event, 'samples': count - previous_count,
+                             'total': count - previous_count, 'max': None, 'timestamp': timestamp})
+            last_saved[('event', event)] = count
+
+        # The max of a phase is per save window
+        for values in durations.values():
+            values[2] = 0.0
+
+    return rows
+
+# Function to run the steps of a job one after another. A step that fails is
+# logged and counted, and the next one still runs, so a database outage does
+# not cost the queued alerts or the self-metrics. Returns the failed steps.
+def run_steps(*steps):
+    failures = 0
+    for step in steps:
+        try:
+            step()
+        except Exception:
+            incr('step_failures')
+            failures += 1
+            print(f"\033[31m{step.__name__} failed\033[0m")
+            traceback.print_exc()
+    return failures
+
+# Function to publish the metrics of a job: a <job>.prom file in the metrics
+# directory (e.g. for the node_exporter textfile collector) and self_stats rows
+def save_metrics(job):
+    # Imported here because the spool's database layer reports to this module
+    from functions.spool import append_rows
+
+    config = load_config()
+    directory = config.get('metrics', {}).get('directory', 'metrics')
+    os.makedirs(directory, exist_ok=True)
+
+    temporary_file = os.path.join(directory, f"{job}.prom.tmp")
+    with open(temporary_file, 'w') as f:
+        f.write(render_prometheus())
+    os.replace(temporary_file, os.path.join(directory, f"{job}.prom"))
+
+    rows = self_stats_rows(job)
+    if rows:
+        append_rows('self_stats', rows)
+
+# Function to publish the metrics of a long-running service (e.g. the read API)
+# every interval seconds until the stop event is set. The service has no
+# daemon draining the spool for it, so the self_stats rows are flushed too.
+def save_metrics_every(job, interval, stop_event):
+    from functions.spool import flush_spool
+
+    def publish_metrics():
+        save_metrics(job)
+        flush_spool()
+
+    while not stop_event.wait(interval):
+        run_steps(publish_metrics)
@@ -1,14 +1,19 @@
 import psutil
-import time
-
-def get_network_io():
-    previous_network = psutil.net_io_counters()
-    time.sleep(1)
-    current_network = psutil.net_io_counters()
-    network_receive_mb = (current_network.bytes_recv - previous_network.bytes_recv) / (1024**2)  # Convert to MB/s
-    network_transmit_mb = (current_network.bytes_sent - previous_network.bytes_sent) / (1024**2)  # Convert to MB/s
-
-    # Convert from MB/s to Mbps
-    network_receive_mbps = network_receive_mb * 8
-    network_transmit_mbps = network_transmit_mb * 8
-    return network_receive_mbps, network_transmit_mbps
\ No newline at end of file
+
+from functions.samples import DeviceSamples
+
+# Interfaces that are never worth reporting
+IGNORED_NICS = ('lo',)
+
+# Function to compute per-interface traffic (Mbps) between two
+# psutil.net_io_counters(pernic=True) readings taken elapsed seconds apart
+def get_network_io_per_nic(previous, current, elapsed):
+    names = [name for name in current if name in previous and name not in IGNORED_NICS]
+    samples = DeviceSamples('nic', names)
+
+    for index, name in enumerate(names):
+        before, after = previous[name], current[name]
+        samples.in_rate[index] = (after.bytes_recv - before.bytes_recv) / elapsed / (1024**2) * 8
+        samples.out_rate[index] = (after.bytes_sent - before.bytes_sent) / elapsed / (1024**2) * 8
+
+    return samples
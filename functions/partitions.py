@@ -0,0 +1,69 @@
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+# Daily partitions are named pYYYYMMDD and hold every row older than the next
+# day, pmax catches anything beyond the last day partition
+def partition_name(day):
+    return day.strftime('p%Y%m%d')
+
+def partition_definition(day):
+    next_day = (day + timedelta(days=1)).strftime('%Y-%m-%d')
+    return f"PARTITION {partition_name(day)} VALUES LESS THAN (UNIX_TIMESTAMP('{next_day} 00:00:00'))"
+
+# Hold a MySQL named lock while applying retention, so two processes never
+# reorganize the same partitions at once. Yields False if another one has it.
+@contextmanager
+def retention_lock(cursor, name='system_monitoring.retention'):
+    cursor.execute("SELECT GET_LOCK(%s, 0)", (name,))
+    acquired = cursor.fetchone()[0] == 1
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (name,))
+            cursor.fetchone()
+
+# Get the names of the partitions of a table, empty if it is not partitioned
+def get_partitions(cursor, table):
+    cursor.execute("""
+        SELECT PARTITION_NAME
+        FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """, (table,))
+    return [row[0] for row in cursor.fetchall()]
+
+# Function to drop the days older than the retention window and create the next
+# days ahead of time. Returns False if the table is not partitioned, so the
+# caller can fall back to deleting rows.
+def rotate_partitions(cursor, table, retention_days=30, days_ahead=3):
+    partitions = get_partitions(cursor, table)
+    if not partitions:
+        return False
+
+    days = sorted(datetime.strptime(name, 'p%Y%m%d').date() for name in partitions if name != 'pmax')
+    today = date.today()
+    cutoff = today - timedelta(days=retention_days)
+
+    # Drop whole days instead of deleting rows one by one
+    expired = [day for day in days if day + timedelta(days=1) <= cutoff]
+    if expired:
+        cursor.execute(f"ALTER TABLE {table} DROP PARTITION {', '.join(partition_name(day) for day in expired)}")
+
+    if days:
+        first_day = days[-1] + timedelta(days=1)
+    else:
+        # First rotation, all existing history is still in pmax: delete what is
+        # past the retention window now and give every remaining day its own
+        # partition, so the history expires day by day like the new samples
+        cursor.execute(f"DELETE FROM {table} WHERE timestamp < %s", (cutoff.strftime('%Y-%m-%d %H:%M:%S'),))
+        cursor.execute(f"SELECT MIN(timestamp) FROM {table}")
+        oldest = cursor.fetchone()[0]
+        first_day = min(max(oldest.date(), cutoff), today) if oldest else today
+
+    missing = [first_day + timedelta(days=offset) for offset in range((today + timedelta(days=days_ahead) - first_day).days + 1)]
+    if missing:
+        definitions = ", ".join([partition_definition(day) for day in missing] + ["PARTITION pmax VALUES LESS THAN MAXVALUE"])
+        cursor.execute(f"ALTER TABLE {table} REORGANIZE PARTITION pmax INTO ({definitions})")
+
+    return True
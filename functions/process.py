@@ -0,0 +1,85 @@
+import heapq
+import psutil
+import time
+
+from functions.metrics import incr
+
+# Only what the rankings need, so psutil reads as few /proc files as possible
+ATTRS = ('name', 'cpu_times', 'memory_info', 'io_counters')
+
+# Rankings stored in process_stats and the value each one is sorted by
+RANKINGS = ('cpu', 'memory', 'io')
+
+# Function to read the cumulative counters of every process within a CPU budget
+# (CPU of the calling thread, so the daemon's other jobs do not count).
+# process_iter() reuses the Process objects of the previous call, so the
+# daemon does not build them again each tick. Passing the result of a previous
+# reading re-reads only those processes, which keeps both ends of a sampling
+# window on the same set. Returns {pid: (process, name, cpu seconds, rss, io bytes)}.
+def read_process_counters(budget=0.2, previous=None):
+    if previous is None:
+        processes = psutil.process_iter(ATTRS, ad_value=None)
+    else:
+        processes = (entry[0] for entry in previous.values())
+
+    counters = {}
+    start = time.thread_time()
+    for process in processes:
+        if previous is None:
+            info = process.info
+        else:
+            try:
+                info = process.as_dict(ATTRS, ad_value=None)
+            except psutil.NoSuchProcess:
+                continue  # Exited during the window
+
+        cpu_times, memory_info, io_counters = info['cpu_times'], info['memory_info'], info['io_counters']
+        counters[process.pid] = (
+            process,
+            info['name'],
+            cpu_times.user + cpu_times.system if cpu_times else None,
+            memory_info.rss if memory_info else None,
+            io_counters.read_bytes + io_counters.write_bytes if io_counters else None,  # Needs root for other users
+        )
+
+        # Hosts with thousands of processes get a partial ranking, not a slow tick
+        if time.thread_time() - start > budget:
+            incr('process_scans_truncated')
+            break
+
+    return counters
+
+# Function to rank the processes by CPU (%), resident memory (MB) and disk IO
+# (MB/s) between two readings taken elapsed seconds apart.
+# Returns {ranking: [process, ...]} with up to `top` processes per ranking.
+def get_top_processes(previous, current, elapsed, top=5):
+    processes = []
+    for pid, (_, name, cpu_seconds, rss, io_bytes) in current.items():
+        before = previous.get(pid)
+        if before is None:
+            continue
+
+        cpu = (cpu_seconds - before[2]) / elapsed * 100 if cpu_seconds is not None and before[2] is not None else None
+        io = (io_bytes - before[4]) / elapsed / (1024**2) if io_bytes is not None and before[4] is not None else None  # Convert to MB/s
+        processes.append({
+            'pid': pid,
+            'name': name,
+            'cpu': cpu,
+            'memory': rss / (1024**2) if rss is not None else None,  # Convert to MB
+            'io': io,
+        })
+
+    return {
+        ranking: heapq.nlargest(top, (process for process in processes if process[ranking]), key=lambda process: process[ranking])
+        for ranking in RANKINGS
+    }
+
+# Rows for the process_stats table
+def process_rows(top_processes, timestamp):
+    for ranking, processes in top_processes.items():
+        for position, process in enumerate(processes, 1):
+            yield {'ranking': ranking, 'position': position, **process, 'timestamp': timestamp}
+
+# Short description of the top processes of a ranking, for alert messages
+def describe_top_processes(processes, ranking, unit):
+    return ", ".join(f"{process['name']} ({process['pid']}) {round(process[ranking], 1)}{unit}" for process in processes)
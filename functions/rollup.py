@@ -0,0 +1,156 @@
+import math
+from datetime import datetime, timedelta
+
+# Rollup tiers and the size of their buckets in seconds
+TIERS = {
+    '1m': 60,
+    '1h': 3600,
+    '1d': 86400,
+}
+
+STATS_METRICS = (
+    'cpu', 'cpu_temp', 'memory', 'swap', 'disk', 'disk_read', 'disk_write',
+    'disk_wait', 'network_receive', 'network_transmit',
+)
+
+EPOCH = datetime(1970, 1, 1)
+
+# Round a timestamp down to the start of its bucket
+def floor_bucket(timestamp, size):
+    seconds = int((timestamp - EPOCH).total_seconds())
+    return EPOCH + timedelta(seconds=seconds - seconds % size)
+
+# Nearest-rank percentile of an already sorted list
+def percentile(values, rank):
+    return values[max(0, math.ceil(rank / 100 * len(values)) - 1)]
+
+def summarize(values):
+    values = sorted(values)
+    return min(values), max(values), sum(values) / len(values), percentile(values, 95)
+
+def get_watermark(cursor, name):
+    cursor.execute("SELECT watermark FROM rollup_watermarks WHERE name = %s", (name,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def set_watermark(cursor, name, watermark):
+    cursor.execute("""
+        INSERT INTO rollup_watermarks (name, watermark)
+        VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE watermark = VALUES(watermark)
+    """, (name, watermark))
+
+# Move the watermarks of a source back to the bucket `oldest` falls in, so
+# rows that arrive after their bucket was rolled up (e.g. replayed from the
+# spool after an outage) are rolled up again by the next run
+def rewind_watermarks(cursor, source, oldest):
+    for tier, size in TIERS.items():
+        bucket = floor_bucket(oldest, size)
+        cursor.execute("""
+            UPDATE rollup_watermarks
+            SET watermark = %s
+            WHERE name = %s AND watermark > %s
+        """, (bucket, f"{source}_{tier}", bucket))
+
+# Aggregate system_stats rows into (node, bucket, metric) rows
+def aggregate_stats(rows, size):
+    buckets = {}
+    for row in rows:
+        node_id, bucket = row[0], floor_bucket(row[1], size)
+        for metric, value in zip(STATS_METRICS, row[2:]):
+            if value is not None:
+                buckets.setdefault((node_id, bucket, metric), []).append(value)
+
+    return [(node_id, bucket, metric, *summarize(values), len(values)) for (node_id, bucket, metric), values in buckets.items()]
+
+# Aggregate latencies rows into (node, bucket, sensor) rows. A probe is a
+# failure when every request was lost, its latency is the burst average and
+# the bucket also keeps its mean packet loss and the p95 of the bursts' p95.
+# Rows from before bursts have no packet loss, 0 was their failure value.
+def aggregate_latencies(rows, size):
+    buckets = {}
+    for node_id, timestamp, sensor_id, response_time, packet_loss, rtt_avg, rtt_p95 in rows:
+        if packet_loss is None:
+            packet_loss = 0.0 if response_time else 100.0
+            rtt_avg = rtt_p95 = response_time or None
+        buckets.setdefault((node_id, floor_bucket(timestamp, size), sensor_id), []).append((packet_loss, rtt_avg, rtt_p95))
+
+    aggregated = []
+    for (node_id, bucket, sensor_id), probes in buckets.items():
+        answered = [rtt_avg for _, rtt_avg, _ in probes if rtt_avg is not None]
+        summary = summarize(answered) if answered else (None, None, None, None)
+        p95s = sorted(rtt_p95 for _, _, rtt_p95 in probes if rtt_p95 is not None)
+        aggregated.append((
+            node_id, bucket, sensor_id, *summary, len(probes), len(probes) - len(answered),
+            sum(packet_loss for packet_loss, _, _ in probes) / len(probes),
+            percentile(p95s, 95) if p95s else None,
+        ))
+    return aggregated
+
+SOURCES = {
+    'system_stats': {
+        'select': f"SELECT node_id, timestamp, {', '.join(STATS_METRICS)} FROM system_stats WHERE timestamp >= %s AND timestamp < %s",
+        'aggregate': aggregate_stats,
+        'columns': ('node_id', 'bucket', 'metric', 'min', 'max', 'avg', 'p95', 'samples'),
+    },
+    'latencies': {
+        'select': "SELECT node_id, timestamp, sensor_id, response_time, packet_loss, rtt_avg, rtt_p95 FROM latencies WHERE timestamp >= %s AND timestamp < %s",
+        'aggregate': aggregate_latencies,
+        'columns': ('node_id', 'bucket', 'sensor_id', 'min', 'max', 'avg', 'p95', 'samples', 'failures', 'packet_loss', 'rtt_p95'),
+    },
+}
+
+# Insert or overwrite aggregated rows, so re-processing a bucket is harmless
+def save_rollup(cursor, table, columns, rows, flush_size=500):
+    updates = ", ".join(f"{column} = VALUES({column})" for column in columns[3:])
+    for start in range(0, len(rows), flush_size):
+        chunk = rows[start:start + flush_size]
+        placeholders = ", ".join(["(" + ", ".join(["%s"] * len(columns)) + ")"] * len(chunk))
+        cursor.execute(f"""
+            INSERT INTO {table} ({', '.join(columns)})
+            VALUES {placeholders}
+            ON DUPLICATE KEY UPDATE {updates}
+        """, [value for row in chunk for value in row])
+
+# Function to roll up every complete bucket since the tier's watermark.
+# Buckets newer than lag seconds are left for later, so rows that arrive a
+# little late are still counted.
+def rollup_tier(connection, source, tier, lag=120):
+    size = TIERS[tier]
+    table = f"{source}_{tier}"
+    spec = SOURCES[source]
+    cursor = connection.cursor()
+
+    try:
+        watermark = get_watermark(cursor, table)
+        if watermark is None:
+            cursor.execute(f"SELECT MIN(timestamp) FROM {source}")
+            oldest = cursor.fetchone()[0]
+            if oldest is None:
+                return
+            watermark = floor_bucket(oldest, size)
+
+        end = floor_bucket(datetime.now() - timedelta(seconds=lag), size)
+
+        # Work one day at a time so catching up never loads the whole table
+        while watermark < end:
+            window_end = min(end, watermark + timedelta(seconds=max(size, 86400)))
+            cursor.execute(spec['select'], (watermark, window_end))
+            rows = spec['aggregate'](cursor.fetchall(), size)
+
+            save_rollup(cursor, table, spec['columns'], rows)
+            set_watermark(cursor, table, window_end)
+            connection.commit()
+            watermark = window_end
+    finally:
+        cursor.close()
+
+# Function to delete rollup rows older than their tier's retention
+def clean_old_rollups(connection, retention):
+    cursor = connection.cursor()
+    for source in SOURCES:
+        for tier in TIERS:
+            cutoff = datetime.now() - timedelta(days=retention[tier])
+            cursor.execute(f"DELETE FROM {source}_{tier} WHERE bucket < %s", (cutoff,))
+    connection.commit()
+    cursor.close()
@@ -0,0 +1,33 @@
+import math
+from array import array
+
+# Compact per-device sample: one name tuple and three float arrays instead of a
+# dict per device, so dozens of disks and interfaces stay cheap to keep around.
+# NaN marks a value the device does not have.
+class DeviceSamples:
+    __slots__ = ('kind', 'names', 'utilization', 'in_rate', 'out_rate')
+
+    def __init__(self, kind, names):
+        self.kind = kind
+        self.names = tuple(names)
+        self.utilization = array('d', [math.nan]) * len(self.names)
+        self.in_rate = array('d', [math.nan]) * len(self.names)
+        self.out_rate = array('d', [math.nan]) * len(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    # Rows for the device_stats table
+    def rows(self, timestamp):
+        def value(number):
+            return None if math.isnan(number) else number
+
+        for index, name in enumerate(self.names):
+            yield {
+                'kind': self.kind,
+                'device': name,
+                'utilization': value(self.utilization[index]),
+                'in_rate': value(self.in_rate[index]),
+                'out_rate': value(self.out_rate[index]),
+                'timestamp': timestamp,
+            }
@@ -0,0 +1,85 @@
+import psutil
+import time
+
+from functions.cpu import get_cpu_temp
+from functions.memory import get_memory, get_swap_memory
+from functions.disk import get_disk_usage, get_disk_usage_all, get_disk_io_per_device
+from functions.network import get_network_io_per_nic
+from functions.process import get_top_processes, read_process_counters
+
+# Read every cumulative counter we derive rates from
+def read_counters(devices=False):
+    counters = {
+        'time': time.monotonic(),
+        'cpu': psutil.cpu_times(),
+        'disk': psutil.disk_io_counters(),
+        'network': psutil.net_io_counters(),
+    }
+    if devices:
+        counters['disks'] = psutil.disk_io_counters(perdisk=True)
+        counters['nics'] = psutil.net_io_counters(pernic=True)
+    return counters
+
+# Function to take a single sample of every metric over one shared interval.
+# With devices=True every disk, interface and mounted filesystem is sampled too.
+# With processes=True the top processes by CPU, memory and IO are ranked over
+# the same window, spending at most process_budget CPU seconds per reading.
+def collect_snapshot(interval=1, devices=False, processes=False, process_budget=0.2, top=5):
+    previous = read_counters(devices)
+    if processes:
+        previous['process_time'] = time.monotonic()
+        previous['processes'] = read_process_counters(process_budget)
+    time.sleep(interval)
+    current = read_counters(devices)
+    if processes:
+        current['process_time'] = time.monotonic()
+        current['processes'] = read_process_counters(process_budget, previous['processes'])
+
+    elapsed = current['time'] - previous['time']
+
+    # CPU usage and IO wait, computed like psutil does but over our own window.
+    # Linux already counts guest time inside user and nice, so like psutil we
+    # leave it out of the total.
+    def total_time(times):
+        return sum(times) - getattr(times, 'guest', 0) - getattr(times, 'guest_nice', 0)
+
+    cpu_total = total_time(current['cpu']) - total_time(previous['cpu'])
+    cpu_idle = current['cpu'].idle - previous['cpu'].idle
+    cpu_iowait = getattr(current['cpu'], 'iowait', 0) - getattr(previous['cpu'], 'iowait', 0)
+    cpu = (cpu_total - cpu_idle - cpu_iowait) / cpu_total * 100 if cpu_total > 0 else 0.0
+    disk_wait = cpu_iowait / cpu_total * 100 if cpu_total > 0 else 0.0
+
+    disk_read = (current['disk'].read_bytes - previous['disk'].read_bytes) / elapsed / (1024**2)  # Convert to MB/s
+    disk_write = (current['disk'].write_bytes - previous['disk'].write_bytes) / elapsed / (1024**2)  # Convert to MB/s
+
+    # Convert from MB/s to Mbps
+    network_receive = (current['network'].bytes_recv - previous['network'].bytes_recv) / elapsed / (1024**2) * 8
+    network_transmit = (current['network'].bytes_sent - previous['network'].bytes_sent) / elapsed / (1024**2) * 8
+
+    snapshot = {
+        'cpu': cpu,
+        'cpu_temp': get_cpu_temp(),
+        'memory': get_memory(),
+        'swap': get_swap_memory(),
+        'disk': get_disk_usage(),
+        'disk_read': disk_read,
+        'disk_write': disk_write,
+        'disk_wait': disk_wait,
+        'network_receive': network_receive,
+        'network_transmit': network_transmit,
+    }
+
+    if devices:
+        snapshot['devices'] = (
+            get_disk_usage_all(),
+            get_disk_io_per_device(previous['disks'], current['disks'], elapsed),
+            get_network_io_per_nic(previous['nics'], current['nics'], elapsed),
+        )
+
+    if processes:
+        # Both scans visit the processes in the same order, so each process was
+        # read about as far apart as the scans started
+        process_elapsed = current['process_time'] - previous['process_time']
+        snapshot['processes'] = get_top_processes(previous['processes'], current['processes'], process_elapsed, top)
+
+    return snapshot
@@ -0,0 +1,180 @@
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from functions.config import load_config
+from functions.database import connect_db
+from functions.ingest import forwards_to_ingest, send_batch
+from functions.metrics import incr, timed
+from functions.rollup import SOURCES, rewind_watermarks
+
+# Local append-only spool: collectors append rows to segment files and a
+# flusher drains them to MySQL in order, so collection never waits for the
+# database and samples taken during an outage are replayed afterwards.
+# Rows are delivered at least once: a crash between the commit and saving the
+# cursor replays the last batch.
+
+def get_spool_config():
+    config = load_config()
+    spool_config = config.get('spool', {})
+    return {
+        'directory': spool_config.get('directory', 'spool'),
+        'segment_size': spool_config.get('segment_size', 4 * 1024 * 1024),
+        'batch_size': spool_config.get('batch_size', 500),
+    }
+
+# Hold an exclusive lock shared by every process using the spool
+@contextmanager
+def locked(directory, name):
+    with open(os.path.join(directory, name), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def get_segments(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith('.log'))
+
+def segment_name(number):
+    return f"{number:012d}.log"
+
+# Function to append rows for a table to the spool
+@timed('spool.append')
+def append_rows(table, rows):
+    spool_config = get_spool_config()
+    directory = spool_config['directory']
+    os.makedirs(directory, exist_ok=True)
+
+    # Every sample is tagged with the node that collected it
+    node_id = load_config().get('node', '')
+    data = "".join(json.dumps({'table': table, 'row': {'node_id': node_id, **row}}) + "\n" for row in rows).encode()
+
+    with locked(directory, 'append.lock'):
+        segments = get_segments(directory)
+        if not segments:
+            segment = segment_name(1)
+        elif os.path.getsize(os.path.join(directory, segments[-1])) >= spool_config['segment_size']:
+            segment = segment_name(int(segments[-1][:-4]) + 1)
+        else:
+            segment = segments[-1]
+
+        fd = os.open(os.path.join(directory, segment), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+def read_cursor(directory):
+    try:
+        with open(os.path.join(directory, 'cursor')) as f:
+            segment, offset = f.read().split()
+            return segment, int(offset)
+    except (FileNotFoundError, ValueError):
+        return None, 0
+
+def write_cursor(directory, segment, offset):
+    temporary_file = os.path.join(directory, 'cursor.tmp')
+    with open(temporary_file, 'w') as f:
+        f.write(f"{segment} {offset}")
+    os.replace(temporary_file, os.path.join(directory, 'cursor'))
+
+# Read the complete records of a segment from an offset, yielding each record
+# with the offset right after it. A trailing partial line is left for later.
+def read_records(path, offset):
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            yield json.loads(line), offset
+
+# Oldest timestamp of a batch, None if its rows carry none
+def oldest_timestamp(rows):
+    timestamps = [row['timestamp'] for row in rows if row.get('timestamp')]
+    if not timestamps:
+        return None
+    oldest = min(timestamps)
+    return datetime.strptime(oldest, '%Y-%m-%d %H:%M:%S') if isinstance(oldest, str) else oldest
+
+# Insert a batch of rows with the same table and columns in one statement.
+# Rows older than the rollup lag (replayed after an outage, or shipped late by
+# a node) may belong to buckets that were already rolled up, so the rollup
+# watermarks are moved back to them in the same transaction.
+def write_batch(table, columns, rows):
+    connection = connect_db('system_monitoring')
+    cursor = connection.cursor()
+    try:
+        placeholders = ", ".join(["(" + ", ".join(["%s"] * len(columns)) + ")"] * len(rows))
+        cursor.execute(f"""
+            INSERT INTO {table} ({', '.join(columns)})
+            VALUES {placeholders}
+        """, [row[column] for row in rows for column in columns])
+
+        if table in SOURCES:
+            oldest = oldest_timestamp(rows)
+            lag = load_config().get('rollups', {}).get('lag', 120)
+            if oldest is not None and oldest < datetime.now() - timedelta(seconds=lag):
+                rewind_watermarks(cursor, table, oldest)
+                incr('rollup_rewinds')
+        connection.commit()
+    finally:
+        cursor.close()
+        connection.close()
+
+# Nodes configured with an ingest server ship their batches there instead of
+# writing to MySQL themselves
+def get_writer():
+    if forwards_to_ingest():
+        return send_batch
+    return write_batch
+
+# Function to drain the spool to MySQL in batches, keeping the original order.
+# Stops at the first failure and resumes from the same row on the next call.
+@timed('spool.flush')
+def flush_spool(writer=None):
+    writer = writer or get_writer()
+    spool_config = get_spool_config()
+    directory = spool_config['directory']
+    if not os.path.isdir(directory):
+        return 0
+
+    flushed = 0
+    with locked(directory, 'flush.lock'):
+        cursor_segment, cursor_offset = read_cursor(directory)
+
+        for segment in get_segments(directory):
+            if cursor_segment is not None and segment < cursor_segment:
+                continue
+            offset = cursor_offset if segment == cursor_segment else 0
+
+            batch_key, batch, batch_end = None, [], offset
+            for record, end in read_records(os.path.join(directory, segment), offset):
+                key = (record['table'], tuple(record['row']))
+                if batch and (key != batch_key or len(batch) >= spool_config['batch_size']):
+                    writer(batch_key[0], batch_key[1], batch)
+                    write_cursor(directory, segment, batch_end)
+                    incr('spool_rows_flushed', len(batch))
+                    flushed += len(batch)
+                    batch = []
+                batch_key = key
+                batch.append(record['row'])
+                batch_end = end
+
+            if batch:
+                writer(batch_key[0], batch_key[1], batch)
+                write_cursor(directory, segment, batch_end)
+                incr('spool_rows_flushed', len(batch))
+                flushed += len(batch)
+
+            cursor_segment, cursor_offset = segment, batch_end
+
+        # Remove fully drained segments, the newest one may still be written to
+        for segment in get_segments(directory)[:-1]:
+            if segment < cursor_segment:
+                os.remove(os.path.join(directory, segment))
+
+    return flushed
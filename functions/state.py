@@ -0,0 +1,63 @@
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+STATE_FILE = 'state.json'
+
+# Small key/value state mirrored to a local file, so the next run (or the next
+# cron process) does not have to ask MySQL for it. Several processes share
+# the file (e.g. the stats and ping cron jobs both keep alert cooldowns in it),
+# so every update re-reads it under a lock and only replaces its own key.
+cache = {'mtime': None, 'state': {}}
+state_lock = threading.Lock()
+
+# Hold an exclusive lock shared by every process using the state file
+@contextmanager
+def locked():
+    with open(STATE_FILE + '.lock', 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+# Parsed state, reloaded only when another process replaced the file
+def load_state():
+    try:
+        mtime = os.stat(STATE_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+
+    if cache['mtime'] != mtime:
+        try:
+            with open(STATE_FILE) as f:
+                cache['state'] = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            cache['state'] = {}
+        cache['mtime'] = mtime
+    return cache['state']
+
+def get_state(key, default=None):
+    with state_lock:
+        return load_state().get(key, default)
+
+# Replace a key with function(current value) and atomically rewrite the state
+# file, keeping whatever other processes stored under the other keys
+def update_state(key, function, default=None):
+    with state_lock, locked():
+        state = dict(load_state())
+        state[key] = function(state.get(key, default))
+
+        temporary_file = f"{STATE_FILE}.{os.getpid()}.tmp"
+        with open(temporary_file, 'w') as f:
+            json.dump(state, f)
+        os.replace(temporary_file, STATE_FILE)
+
+        cache['state'] = state
+        cache['mtime'] = os.stat(STATE_FILE).st_mtime_ns
+        return state[key]
+
+def set_state(key, value):
+    update_state(key, lambda current: value)
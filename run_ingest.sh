@@ -0,0 +1,4 @@
+source /root/system-monitoring/myenv/bin/activate
+
+cd /root/system-monitoring
+exec python3 -m scripts.ingest
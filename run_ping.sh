@@ -1,3 +1,2 @@
-source /root/system-monitoring/myenv/bin/activate
-
-python3 /root/system-monitoring/scripts/ping.py
\ No newline at end of file
+cd /root/system-monitoring
+exec /root/system-monitoring/myenv/bin/python3 -m scripts.run ping
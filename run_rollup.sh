@@ -0,0 +1,2 @@
+cd /root/system-monitoring
+exec /root/system-monitoring/myenv/bin/python3 -m scripts.run rollup
@@ -1,4 +1,2 @@
-source /root/system-monitoring/myenv/bin/activate
-
 cd /root/system-monitoring
-python3 -m scripts.stats
+exec /root/system-monitoring/myenv/bin/python3 -m scripts.run stats
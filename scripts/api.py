@@ -0,0 +1,238 @@
+import json
+import re
+import threading
+import traceback
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from functions.cache import RangeCache
+from functions.config import load_config
+from functions.database import connect_db
+from functions.ingest import parse_address
+from functions.metrics import incr, save_metrics_every, timed
+from functions.rollup import STATS_METRICS, TIERS, floor_bucket
+from scripts.rollup import DEFAULT_RETENTION
+
+# Read API for dashboards:
+#   GET /latest?node=NODE                                   latest system_stats sample
+#   GET /metrics/<metric>?node=NODE&from=&to=&resolution=   one metric over a range
+#   GET /sensors/<id>/latency?node=NODE&from=&to=&resolution=
+# from/to are epoch seconds or ISO dates, to defaults to now and from to one
+# hour before. resolution is raw, 1m, 1h, 1d or auto (the default), which
+# picks the finest tier that keeps the series under api.max_points.
+#
+# Responses go through an LRU/TTL cache keyed on (metric, range, resolution).
+# A poller watches the newest sample of each table and only drops the cached
+# ranges that reach past it, so old ranges stay cached while viewers poll.
+
+RAW_RETENTION_DAYS = 30
+
+def get_api_config():
+    config = load_config()
+    api_config = config.get('api', {})
+    return {
+        'listen': api_config.get('listen', '127.0.0.1:8080'),
+        'cache_size': api_config.get('cache_size', 1024),
+        'ttl': api_config.get('ttl', 300),
+        'poll': api_config.get('poll', 5),
+        'max_points': api_config.get('max_points', 1000),
+        'retention': {**DEFAULT_RETENTION, **config.get('rollups', {}).get('retention', {})},
+    }
+
+api_config = get_api_config()
+cache = RangeCache(api_config['cache_size'], api_config['ttl'])
+
+class BadRequest(Exception):
+    pass
+
+# Stored timestamps are naive local time, so epochs and ISO dates with an
+# offset are converted to it
+def parse_time(value, default):
+    if value is None:
+        return default
+    try:
+        if value.isdigit():
+            return datetime.fromtimestamp(int(value))
+        parsed = datetime.fromisoformat(value)
+    except (ValueError, OverflowError, OSError):
+        raise BadRequest(f"Invalid date: {value}")
+
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+# Pick the finest tier that still holds `start` and keeps the series short
+def select_resolution(start, end, resolution):
+    if resolution != 'auto':
+        if resolution != 'raw' and resolution not in TIERS:
+            raise BadRequest(f"Unknown resolution: {resolution}")
+        return resolution
+
+    age = datetime.now() - start
+    span = (end - start).total_seconds()
+
+    # Raw samples arrive at most every 10 seconds
+    if age <= timedelta(days=RAW_RETENTION_DAYS) and span <= api_config['max_points'] * 10:
+        return 'raw'
+    for tier, size in TIERS.items():
+        if age <= timedelta(days=api_config['retention'][tier]) and span / size <= api_config['max_points']:
+            return tier
+    return '1d'
+
+# Align a range to its resolution, so viewers asking for "the last hour" a
+# few seconds apart share one cache entry
+def align_range(start, end, resolution):
+    size = TIERS.get(resolution, 10)
+    return floor_bucket(start, size), floor_bucket(end, size) + timedelta(seconds=size)
+
+def query(sql, params):
+    connection = connect_db('system_monitoring')
+    cursor = connection.cursor(dictionary=True)
+    try:
+        with timed('api.query'):
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+    finally:
+        cursor.close()
+        connection.close()
+
+def get_latest(node):
+    def load():
+        rows = query(f"""
+            SELECT node_id, timestamp, {', '.join(STATS_METRICS)}
+            FROM system_stats
+            WHERE node_id = %s
+            ORDER BY timestamp DESC
+            LIMIT 1
+        """, (node,))
+        return rows[0] if rows else None
+
+    return cache.get_or_load(('latest', node), 'system_stats', None, load)
+
+def get_metric_series(metric, node, start, end, resolution):
+    if metric not in STATS_METRICS:
+        raise BadRequest(f"Unknown metric: {metric}")
+
+    resolution = select_resolution(start, end, resolution)
+    start, end = align_range(start, end, resolution)
+
+    def load():
+        if resolution == 'raw':
+            return query(f"""
+                SELECT timestamp, {metric} AS value
+                FROM system_stats
+                WHERE node_id = %s AND timestamp >= %s AND timestamp < %s
+                ORDER BY timestamp
+            """, (node, start, end))
+        return query(f"""
+            SELECT bucket AS timestamp, min, max, avg, p95, samples
+            FROM system_stats_{resolution}
+            WHERE node_id = %s AND metric = %s AND bucket >= %s AND bucket < %s
+            ORDER BY bucket
+        """, (node, metric, start, end))
+
+    key = ('metric', metric, node, start, end, resolution)
+    return resolution, cache.get_or_load(key, 'system_stats', end, load)
+
+def get_latency_series(sensor_id, node, start, end, resolution):
+    resolution = select_resolution(start, end, resolution)
+    start, end = align_range(start, end, resolution)
+
+    def load():
+        if resolution == 'raw':
+            return query("""
+                SELECT timestamp, response_time, packet_loss, rtt_min, rtt_avg, rtt_max, rtt_mdev, jitter, rtt_p95
+                FROM latencies
+                WHERE node_id = %s AND sensor_id = %s AND timestamp >= %s AND timestamp < %s
+                ORDER BY timestamp
+            """, (node, sensor_id, start, end))
+        return query(f"""
+            SELECT bucket AS timestamp, min, max, avg, p95, samples, failures, packet_loss, rtt_p95
+            FROM latencies_{resolution}
+            WHERE node_id = %s AND sensor_id = %s AND bucket >= %s AND bucket < %s
+            ORDER BY bucket
+        """, (node, sensor_id, start, end))
+
+    key = ('latency', sensor_id, node, start, end, resolution)
+    return resolution, cache.get_or_load(key, 'latencies', end, load)
+
+class ApiHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        node = params.get('node', load_config().get('node', ''))
+        resolution = params.get('resolution', 'auto')
+        incr('api_requests')
+
+        try:
+            end = parse_time(params.get('to'), datetime.now())
+            start = parse_time(params.get('from'), end - timedelta(hours=1))
+
+            if url.path == '/latest':
+                body = {'node': node, 'latest': get_latest(node)}
+            elif match := re.fullmatch(r'/metrics/(\w+)', url.path):
+                resolution, series = get_metric_series(match.group(1), node, start, end, resolution)
+                body = {'node': node, 'metric': match.group(1), 'resolution': resolution, 'series': series}
+            elif match := re.fullmatch(r'/sensors/(\d+)/latency', url.path):
+                resolution, series = get_latency_series(int(match.group(1)), node, start, end, resolution)
+                body = {'node': node, 'sensor_id': int(match.group(1)), 'resolution': resolution, 'series': series}
+            else:
+                return self.respond(404, {'error': 'Not found'})
+        except BadRequest as error:
+            return self.respond(400, {'error': str(error)})
+        except Exception:
+            traceback.print_exc()
+            return self.respond(500, {'error': 'Internal error'})
+
+        self.respond(200, body)
+
+    def respond(self, status, body):
+        data = json.dumps(body, default=str).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # One line per request would drown the log
+
+# Function to watch the newest sample of each table and invalidate the cached
+# ranges that reach past the previous newest sample
+def watch_new_samples(stop_event):
+    newest = {'system_stats': None, 'latencies': None}
+
+    while not stop_event.wait(api_config['poll']):
+        for table in newest:
+            try:
+                rows = query(f"SELECT MAX(timestamp) AS newest FROM {table}", ())
+            except Exception:
+                traceback.print_exc()
+                continue
+
+            latest = rows[0]['newest'] if rows else None
+            if latest is not None and latest != newest[table]:
+                if newest[table] is not None:
+                    incr('api_invalidated', cache.invalidate_after(table, newest[table]))
+                newest[table] = latest
+
+# Main function to serve the read API
+def run_api():
+    stop_event = threading.Event()
+    threading.Thread(target=watch_new_samples, args=(stop_event,), name='invalidation', daemon=True).start()
+
+    metrics_interval = load_config().get('metrics', {}).get('interval', 60)
+    if metrics_interval:
+        threading.Thread(target=save_metrics_every, args=('api', metrics_interval, stop_event), name='metrics', daemon=True).start()
+
+    address = parse_address(api_config['listen'])
+    with ThreadingHTTPServer(address, ApiHandler) as server:
+        print(f"Serving the read API on http://{address[0]}:{address[1]}")
+        try:
+            server.serve_forever()
+        finally:
+            stop_event.set()
+
+if __name__ == "__main__":
+    run_api()
@@ -0,0 +1,92 @@
+import signal
+import threading
+import time
+import traceback
+from datetime import datetime
+
+from functions.alerts import flush_alerts
+from functions.config import load_config
+from functions.metrics import incr, save_metrics
+from functions.spool import flush_spool
+from scripts import stats, ping, rollup
+
+# Jobs the daemon knows how to run and their default intervals in seconds
+JOBS = {
+    'stats': (stats.display_and_save_info, 60),
+    'ping': (ping.collect_and_save_ping_data, 60),
+    'cleanup': (lambda: (stats.clean_old_records(), ping.clean_old_pings()), 3600),
+    'rollup': (rollup.run_rollups, 60),
+    'spool': (flush_spool, 5),
+    'metrics': (lambda: save_metrics('daemon'), 60),
+}
+
+def get_current_time():
+    return datetime.now().strftime('%d %b %Y %H:%M:%S')
+
+# Function to run a job on a fixed monotonic tick until the stop event is set.
+# When a run takes longer than its interval the missed ticks are either
+# skipped (wait for the next tick) or coalesced (run once right away).
+def run_job(name, job, interval, overrun, stop_event):
+    start = time.monotonic()
+    tick = 0
+
+    while not stop_event.is_set():
+        try:
+            job()
+        except Exception:
+            print(f"\033[31m[{get_current_time()}] - {name} failed\033[0m")
+            incr(f"job_failures.{name}")
+            traceback.print_exc()
+
+        now = time.monotonic()
+        missed = int((now - start) // interval) - tick
+        if missed > 0:
+            print(f"[{get_current_time()}] - {name} overran its {interval}s interval by {missed} tick(s)")
+            incr(f"cycle_overruns.{name}", missed)
+            if overrun == 'coalesce':
+                tick += missed
+                continue
+
+        tick += max(missed, 0) + 1
+        stop_event.wait(start + tick * interval - now)
+
+# Main function to run every configured job until SIGTERM or SIGINT
+def run_daemon():
+    config = load_config()
+    daemon_config = config.get('daemon', {})
+    intervals = daemon_config.get('jobs', {})
+    overrun = daemon_config.get('overrun', 'skip')
+
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+
+    threads = []
+    for name, (job, default_interval) in JOBS.items():
+        interval = intervals.get(name, default_interval)
+        if not interval:
+            continue  # A job with interval 0 or null is disabled
+
+        thread = threading.Thread(target=run_job, args=(name, job, interval, overrun, stop_event), name=name)
+        thread.start()
+        threads.append(thread)
+        print(f"[{get_current_time()}] - Scheduled {name} every {interval}s")
+
+    # Wait on the event so signals are handled promptly by the main thread
+    while not stop_event.wait(1):
+        pass
+
+    print(f"[{get_current_time()}] - Stopping, waiting for running jobs to finish")
+    for thread in threads:
+        thread.join()
+
+    # Try to leave nothing behind in the spool
+    try:
+        flush_spool()
+    except Exception:
+        print(f"\033[31m[{get_current_time()}] - Could not flush the spool, it will be replayed on the next start\033[0m")
+    flush_alerts()
+    save_metrics('daemon')
+
+if __name__ == "__main__":
+    run_daemon()
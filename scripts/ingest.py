@@ -0,0 +1,95 @@
+import socketserver
+import threading
+import traceback
+from datetime import datetime
+
+from functions.config import load_config
+from functions.ingest import MAX_FRAME, IngestError, encode_frame, read_frame, validate_batch, parse_address
+from functions.metrics import incr, run_steps, save_metrics_every, timed
+from functions.spool import write_batch
+
+# Central ingest service: nodes configured with "ingest": {"server": ...} push
+# their spooled batches here and this process bulk inserts them into MySQL,
+# so the database sees one INSERT per batch instead of one connection per node.
+
+def get_current_time():
+    return datetime.now().strftime('%d %b %Y %H:%M Hs')
+
+class IngestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        ingest_config = load_config()['ingest']
+        token = ingest_config['token']
+        max_frame = ingest_config.get('max_frame', MAX_FRAME)
+
+        while True:
+            try:
+                document = read_frame(self.request, max_frame)
+            except (IngestError, ValueError, OSError) as error:
+                # The stream can not be trusted anymore, drop the connection
+                print(f"\033[31m[{get_current_time()}] - Bad frame from {self.client_address[0]}: {error}\033[0m")
+                return
+            if document is None:
+                return
+
+            try:
+                table, columns, rows = validate_batch(document, token)
+
+                # Samples belong to the node that sent them
+                if 'node_id' not in columns:
+                    columns = ['node_id', *columns]
+                    rows = [[document.get('node', ''), *row] for row in rows]
+
+                if rows:
+                    with timed('ingest.write'):
+                        write_batch(table, columns, [dict(zip(columns, row)) for row in rows])
+                incr('ingest_rows', len(rows))
+                reply = {'ok': True}
+            except IngestError as error:
+                incr('ingest_rejected')
+                reply = {'ok': False, 'error': str(error)}
+            except Exception:
+                incr('ingest_failed')
+                traceback.print_exc()
+                reply = {'ok': False, 'error': 'Could not save the batch'}
+
+            self.request.sendall(encode_frame(reply))
+
+class IngestServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+# Function to apply the retention of the raw sample tables for every node,
+# since nodes forwarding to this service skip it
+def run_retention(interval, stop_event):
+    from scripts import ping, stats  # Only their retention helpers are used
+
+    while True:
+        run_steps(stats.clean_old_records, ping.clean_old_pings)
+        if stop_event.wait(interval):
+            return
+
+# Main function to run the ingest service
+def run_ingest():
+    ingest_config = load_config()['ingest']
+    if not ingest_config.get('token'):
+        raise SystemExit("Set ingest.token in config.json before starting the ingest service")
+
+    stop_event = threading.Event()
+    retention_interval = ingest_config.get('retention_interval', 3600)
+    if retention_interval:
+        threading.Thread(target=run_retention, args=(retention_interval, stop_event), name='retention', daemon=True).start()
+
+    metrics_interval = load_config().get('metrics', {}).get('interval', 60)
+    if metrics_interval:
+        threading.Thread(target=save_metrics_every, args=('ingest', metrics_interval, stop_event), name='metrics', daemon=True).start()
+
+    address = parse_address(ingest_config.get('listen', '0.0.0.0:9900'))
+    with IngestServer(address, IngestHandler) as server:
+        print(f"[{get_current_time()}] - Listening for node batches on {address[0]}:{address[1]}")
+        try:
+            server.serve_forever()
+        finally:
+            stop_event.set()
+
+if __name__ == "__main__":
+    run_ingest()
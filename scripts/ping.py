@@ -1,62 +1,74 @@
-import json
-import mysql.connector
 import math
-from ping3 import ping
+import time
 from datetime import datetime, timedelta
 
-# Load configuration from the JSON file
-def load_config():
-    with open('config.json') as f:
-        config = json.load(f)
-    return config
-
-# General function to connect to the MySQL database
-def connect_db(database):
-    config = load_config()  # Load the configuration
-    db_config = config['databases'][database]  # Get the database configuration
-
-    connection = mysql.connector.connect(
-        host=db_config['host'],
-        user=db_config['user'],
-        password=db_config['password'],
-        database=db_config['database'],
-        charset=db_config.get('charset', 'utf8mb4'),  # Default charset if not provided
-        collation=db_config.get('collation', 'utf8mb4_unicode_ci')  # Default collation if not provided
-    )
-    return connection
+from functions.alerts import send_alert, flush_alerts
+from functions.config import load_config
+from functions.database import connect_db
+from functions.icmp import probe_bursts, probe_hosts, resolve_hosts, summarize_rtts
+from functions.ingest import forwards_to_ingest
+from functions.metrics import incr, run_steps, timed, save_metrics
+from functions.partitions import retention_lock, rotate_partitions
+from functions.spool import append_rows, flush_spool
+
+# Save a batch of ping results and sensor states. The latencies go to the local
+# spool, which the flusher drains with multi-row INSERTs. Every chunk of
+# flush_size sensors costs one UPDATE of sensors, all in a single transaction.
+@timed('ping.save')
+def save_ping_to_db(results, flush_size=500):
+    if not results:
+        return
+
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    append_rows('latencies', [
+        {'sensor_id': sensor['id'], **probe, 'timestamp': timestamp}
+        for sensor, probe in results
+    ])
 
-# Save ping result to the system_monitoring database 
-def save_ping_to_db(sensor, response_time):
     connection = connect_db('system_monitoring')  # Connect to the system_monitoring DB
     cursor = connection.cursor()
 
-    # Insert data into the latencies table
-    cursor.execute(""" 
-        INSERT INTO latencies (sensor_id, response_time)
-        VALUES (%s, %s)
-    """, (sensor['id'], response_time))
-
-    connection.commit()
-    cursor.close()
-    connection.close()
-
-# Insert alert into the whatsapp database
-def insert_alert(phone, message):
-    connection = connect_db('whatsapp')  # Connect to the WhatsApp DB
-    cursor = connection.cursor()
-
-    # Insert alert into the alerts table
-    cursor.execute(""" 
-        INSERT INTO messages (phone, message)
-        VALUES (%s, %s)
-    """, (phone, message))
-
-    connection.commit()
-    cursor.close()
-    connection.close()
+    try:
+        for start in range(0, len(results), flush_size):
+            chunk = results[start:start + flush_size]
+
+            # Update the state of every sensor in the chunk at once
+            cases = " ".join(["WHEN %s THEN %s"] * len(chunk))
+            ids = ", ".join(["%s"] * len(chunk))
+            values = []
+            for column in ('failed', 'high_ping_count', 'active'):
+                values += [value for sensor, _ in chunk for value in (sensor['id'], sensor[column])]
+            values += [sensor['id'] for sensor, _ in chunk]
+            cursor.execute(f"""
+                UPDATE sensors
+                SET failed = CASE id {cases} END,
+                    high_ping_count = CASE id {cases} END,
+                    active = CASE id {cases} END
+                WHERE id IN ({ids})
+            """, values)
+
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+        connection.close()
+
+# Queue a sensor alert, every alert of a sweep ends up in one message
+def insert_alert(phone, message, key=None):
+    config = load_config()
+    node = config.get('node', 'Unknown Node')
+    title = f"⚠️ *Sensors alert* ⚠️ \n\n*Node:* {node} \n*Date:* {get_current_time()}"
+    send_alert(phone, title, message, key=f"{node}:{key}" if key else None)
 
-# Function to clean old pings from the database (older than 30 days)
+# Function to clean old pings from the database (older than 30 days). Nodes
+# forwarding to an ingest server leave retention to the ingest service.
+@timed('ping.clean')
 def clean_old_pings():
+    if forwards_to_ingest():
+        return
+
     connection = connect_db('system_monitoring')  # Connect to the system_monitoring DB
     cursor = connection.cursor()
 
@@ -64,141 +76,164 @@ def clean_old_pings():
     cutoff_date = datetime.now() - timedelta(days=30)
     cutoff_timestamp = cutoff_date.strftime('%Y-%m-%d %H:%M:%S')
 
-    # Delete records older than the cutoff date
-    cursor.execute(""" 
-        DELETE FROM latencies
-        WHERE timestamp < %s
-    """, (cutoff_timestamp,))
+    # Drop the partitions older than the cutoff date, or delete the records
+    # one by one if the table has not been partitioned yet. Skip this run if
+    # another process is already applying retention.
+    with retention_lock(cursor) as acquired:
+        if acquired and not rotate_partitions(cursor, 'latencies', 30):
+            cursor.execute(""" 
+                DELETE FROM latencies
+                WHERE timestamp < %s
+            """, (cutoff_timestamp,))
 
     connection.commit()
     cursor.close()
     connection.close()
 
-# Function to make up to 4 ping attempts and return the result
-def ping_sensor(ip_address):
-    max_attempts = 4  # Maximum number of attempts
-    for attempt in range(max_attempts):
-        # Perform the ping
-        response_time = ping(ip_address, unit='ms')
-            
-        # If the response time is None, it means the ping failed
-        if not response_time:
-            if attempt == max_attempts - 1:
-                # If it's the last attempt and it fails, return 0
-                return 0
-            else:
-                # If it's not the last attempt, continue trying
-                continue
-
-        # Truncate the response time to two decimal places
-        return math.trunc(response_time)
-
-    return 0  # If all attempts fail, return 0
+# Function to ping every sensor concurrently and return {sensor id: probe}, where
+# a probe holds the packet loss and round trip statistics of the sensor's burst.
+# With ping.count above 1 every sensor gets a burst of that many requests,
+# otherwise a single request retried up to ping.attempts times.
+@timed('ping.sweep')
+def ping_sensors(sensors):
+    config = load_config()
+    ping_config = config.get('ping', {})
+    timeout = ping_config.get('timeout', 4)  # Seconds the whole sweep may last
+    attempts = ping_config.get('attempts', 4)  # Maximum number of attempts per sensor
+    count = ping_config.get('count', 1)  # Requests per sensor in burst mode
+
+    # Name resolution may use up to half of the sweep, the probes get the rest.
+    # Sensors whose name did not resolve in time count as not responding.
+    start = time.monotonic()
+    addresses = resolve_hosts({sensor['ip'] for sensor in sensors}, timeout=timeout / 2)
+    timeout -= time.monotonic() - start
+
+    targets = [(sensor['id'], addresses[sensor['ip']]) for sensor in sensors]
+    if count > 1:
+        results = probe_bursts(targets, count=count, timeout=timeout, spacing=ping_config.get('spacing', 0.02))
+    else:
+        results = {key: [rtt] for key, rtt in probe_hosts(targets, timeout=timeout, attempts=attempts).items()}
+    incr('probe_timeouts', sum(rtts.count(None) for rtts in results.values()))
+
+    probes = {}
+    for key, rtts in results.items():
+        probe = summarize_rtts(rtts)
+
+        # Truncate the average response time, a sensor that never answered gets 0
+        probe['response_time'] = math.trunc(probe['rtt_avg']) if probe['rtt_avg'] else 0
+        probes[key] = probe
+    return probes
 
 # Function to get the current date and time as a formatted string
 def get_current_time():
     return datetime.now().strftime('%d %b %Y %H:%M Hs')
 
-# Function to check and notify if the ping exceeds the threshold or if the ping is 0
-def check_ping_threshold(sensor, response_time):
-    config = load_config()
+# Without rules in config.json, alert when the last 6 pings are all over the threshold
+DEFAULT_RULES = [{"type": "min", "window": 6, "above": "threshold"}]
+
+# Function to evaluate the latency history of every sensor at once and return
+# the ids of the sensors whose ping is high. The history holds the 95th
+# percentile of every burst, so one slow reply does not look like a trend.
+def detect_high_pings(sensors, probes, config):
+    from functions.anomaly import detect_anomalies  # Imports numpy, deferred until there is a sample to evaluate
+
+    anomaly_config = config.get('anomaly', {})
+    rules = anomaly_config.get('rules', {}).get('latency', DEFAULT_RULES)
+
+    anomalies = detect_anomalies(
+        'latency',
+        {sensor['id']: probes[sensor['id']]['rtt_p95'] for sensor in sensors},  # Offline is not a latency
+        {sensor['id']: rules for sensor in sensors},
+        {sensor['id']: sensor['threshold'] for sensor in sensors},
+        capacity=anomaly_config.get('history', 60),
+    )
+    return {int(key) for key, _, _ in anomalies}
+
+# Function to check and notify if the ping is high, if the sensor is losing
+# packets or if it did not answer at all.
+# Only the sensor object is updated here, save_ping_to_db() persists its new state.
+def check_ping_threshold(sensor, probe, config, high_ping=False):
     node = config.get('node', 'Unknown Node')
     failure_threshold = config['thresholds']['failures']
+    loss_threshold = config['thresholds'].get('loss', 20)
 
-    connection = connect_db('system_monitoring')  
-    cursor = connection.cursor()
-
-    # If the ping response time is 0 (offline)
-    if response_time == 0:
+    # If every request was lost (offline)
+    if probe['rtt_avg'] is None:
         # Increment the 'failed' count in the sensor object
         sensor['failed'] += 1
 
         # Send an alert that the sensor is not responding
-        message = f"⚠️ *{sensor['name']} not responding* ⚠️ \n\n*Node:* {node} \n*Date:* {get_current_time()}"
-        insert_alert(config['ping-alerts-channel'], message)
+        message = f"*{sensor['name']}* not responding"
+        insert_alert(config['ping-alerts-channel'], message, key=f"offline:{sensor['id']}")
         print(f"[{get_current_time()}] - {sensor['name']} not responding on {node}")
 
         # If the 'failed' count exceeds the failure threshold, deactivate the sensor
         if sensor['failed'] >= failure_threshold:
-            cursor.execute("""
-                UPDATE sensors
-                SET failed = %s, active = FALSE
-                WHERE id = %s
-            """, (sensor['failed'], sensor['id'],))
+            sensor['active'] = False
 
-            message = f"[{get_current_time()}] - {sensor['name']} has been deactivated due to multiple failures"
+            message = f"*{sensor['name']}* has been deactivated due to multiple failures"
             insert_alert(config['ping-alerts-channel'], message)
 
             print(f"\033[31m[{get_current_time()}] - {sensor['name']} has been deactivated due to multiple failures\033[0m")
-        else: 
-            cursor.execute("""
-                UPDATE sensors
-                SET failed = %s
-                WHERE id = %s
-            """, (sensor['failed'], sensor['id'],))
     else:
         # If the ping is successful (response time > 0), reset 'failed' count to 0
         sensor['failed'] = 0
         
-        # If ping exceeds threshold, send an alert
-        if response_time > sensor['threshold']:
-            if sensor['high_ping_count'] > 5:
-                sensor['high_ping_count'] = 0
-
-                message = f"⚠️ *{sensor['name']} ping is high* ⚠️ \n\n*Node:* {node} \n*Response time:* {response_time} ms \n*Date:* {get_current_time()}"
-                insert_alert(config['ping-alerts-channel'], message)
-
-                print(f"[{get_current_time()}] - {sensor['name']} ping is high on {node}. Response time: {response_time} ms")
-            
-                cursor.execute("""
-                    UPDATE sensors
-                    SET high_ping_count = %s, failed = %s
-                    WHERE id = %s
-                """, (sensor['high_ping_count'], sensor['failed'], sensor['id']))
-            else: 
-                sensor['high_ping_count'] += 1
-                
-                cursor.execute("""
-                    UPDATE sensors
-                    SET high_ping_count = %s, failed = %s
-                    WHERE id = %s
-                """, (sensor['high_ping_count'], sensor['failed'], sensor['id']))
+        # Send an alert if part of the burst was lost
+        if probe['packet_loss'] >= loss_threshold:
+            message = f"*{sensor['name']}* is losing {probe['packet_loss']:.0f}% of packets"
+            insert_alert(config['ping-alerts-channel'], message, key=f"loss:{sensor['id']}")
+
+            print(f"[{get_current_time()}] - {sensor['name']} is losing {probe['packet_loss']:.0f}% of packets on {node}")
+
+        # Count consecutive pings over the threshold
+        if probe['rtt_p95'] > sensor['threshold']:
+            sensor['high_ping_count'] += 1
         else:
             # all ok, ping is low and sensor is responding
-            cursor.execute("""
-                    UPDATE sensors
-                    SET high_ping_count = 0, failed = 0
-                    WHERE id = %s
-                """, (sensor['id'],))
+            sensor['high_ping_count'] = 0
 
-    connection.commit()  # Commit the changes
-    cursor.close()
-    connection.close()
+        # If the latency rules triggered, send an alert
+        if high_ping:
+            message = f"*{sensor['name']}* ping is high, response time: {probe['response_time']} ms (p95 {probe['rtt_p95']:.0f} ms)"
+            insert_alert(config['ping-alerts-channel'], message, key=f"high:{sensor['id']}")
+
+            print(f"[{get_current_time()}] - {sensor['name']} ping is high on {node}. Response time: {probe['response_time']} ms")
 
 # Function to collect ping data for all sensors (updated)
+@timed('ping.cycle')
 def collect_and_save_ping_data():
     # Get the list of active sensors from the database
     sensors = get_sensors_from_db()
+    if not sensors:
+        return
+
+    config = load_config()
 
-    # Clean old pings before collecting new data
-    clean_old_pings()
+    # Ping all sensors at once instead of one after another
+    probes = ping_sensors(sensors)
+    high_pings = detect_high_pings(sensors, probes, config)
+    results = []
 
     for sensor in sensors:
-        response_time = ping_sensor(sensor['ip'])
+        probe = probes[sensor['id']]
+        response_time = probe['response_time']
         
         # Simplified output for online/offline status with color
-        if response_time == 0:
+        if probe['rtt_avg'] is None:
             print(f"[{get_current_time()}] Pinging {sensor['name']} ..... \033[31mOFFLINE\033[0m")  # Red for OFFLINE
         else:
-            print(f"[{get_current_time()}] Pinging {sensor['name']} ..... \033[32mONLINE {response_time}ms\033[0m")  # Green for ONLINE
+            print(f"[{get_current_time()}] Pinging {sensor['name']} ..... \033[32mONLINE {response_time}ms\033[0m {probe['packet_loss']:.0f}% loss")  # Green for ONLINE
 
-        # Save the ping result to the system_monitoring database
-        save_ping_to_db(sensor, response_time)
+        # Check if the ping exceeds the threshold, loses packets or is 0, and send an alert if needed
+        check_ping_threshold(sensor, probe, config, sensor['id'] in high_pings)
+        results.append((sensor, probe))
 
-        # Check if the ping exceeds the threshold or is 0, and send an alert if needed
-        check_ping_threshold(sensor, response_time)
+    # Save every result and sensor state in one transaction
+    save_ping_to_db(results, config.get('ping', {}).get('flush_size', 500))
 
 # Function to get the sensors from the database with their thresholds
+@timed('ping.sensors')
 def get_sensors_from_db():
     connection = connect_db('system_monitoring')  # Connect to the system_monitoring DB
     cursor = connection.cursor(dictionary=True)
@@ -216,6 +251,13 @@ def get_sensors_from_db():
     
     return sensors
 
-# Main function to run the ping process
+# Main function to run the ping process, also started by scripts/run.py
+def main():
+    failures = run_steps(clean_old_pings, collect_and_save_ping_data, flush_spool)
+    flush_alerts()
+    save_metrics('ping')
+    if failures:
+        raise SystemExit(1)
+
 if __name__ == "__main__":
-    collect_and_save_ping_data()
+    main()
@@ -0,0 +1,44 @@
+from datetime import datetime
+
+from functions.config import load_config
+from functions.database import connect_db
+from functions.metrics import run_steps, timed, save_metrics
+from functions.rollup import SOURCES, TIERS, rollup_tier, clean_old_rollups
+
+# Default retention of each tier in days
+DEFAULT_RETENTION = {
+    '1m': 7,
+    '1h': 90,
+    '1d': 365,
+}
+
+def get_current_time():
+    return datetime.now().strftime('%d %b %Y %H:%M Hs')
+
+# Function to update every rollup tier and apply their retention
+@timed('rollup.cycle')
+def run_rollups():
+    config = load_config()
+    rollup_config = config.get('rollups', {})
+    retention = {**DEFAULT_RETENTION, **rollup_config.get('retention', {})}
+
+    connection = connect_db('system_monitoring')
+    try:
+        for source in SOURCES:
+            for tier in TIERS:
+                rollup_tier(connection, source, tier, rollup_config.get('lag', 120))
+                print(f"[{get_current_time()}] - Rolled up {source} into {source}_{tier}")
+
+        clean_old_rollups(connection, retention)
+    finally:
+        connection.close()
+
+# Main function of a single rollup run, also started by scripts/run.py
+def main():
+    failures = run_steps(run_rollups)
+    save_metrics('rollup')
+    if failures:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import time
+
+# Taken first, so the report covers every import below
+started = time.perf_counter()
+interpreter = time.process_time()  # CPU the interpreter spent starting up
+
+import builtins
+import sys
+
+# Fast-start entry point for the cron jobs:
+#   python3 -m scripts.run stats|ping|rollup [--profile-imports]
+# Only the job's own modules are imported, mysql.connector and numpy are
+# loaded the first time they are used, and the time until the job starts is
+# saved with the job's metrics as the "startup" phase. --profile-imports also
+# prints how that time splits between packages (python3 -X importtime gives
+# the full tree).
+
+JOBS = {
+    'stats': ('scripts.stats', 'main'),
+    'ping': ('scripts.ping', 'main'),
+    'rollup': ('scripts.rollup', 'main'),
+}
+
+# Function to time every import by top-level package. A nested import is only
+# counted once: its time is taken out of the package that imported it.
+def profile_imports():
+    timings = {}  # package -> seconds
+    stack = []  # time spent in nested imports, one entry per import in progress
+    original_import = builtins.__import__
+
+    def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+        if level:
+            package = (globals or {}).get('__package__') or name
+        else:
+            package = name
+        package = package.split('.')[0]
+
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = stack.pop()
+            timings[package] = timings.get(package, 0.0) + elapsed - nested
+            if stack:
+                stack[-1] += elapsed
+
+    builtins.__import__ = timed_import
+    return timings
+
+def print_import_report(title, timings, total):
+    print(f"{title}: {total * 1000:.1f} ms")
+    for package, seconds in sorted(timings.items(), key=lambda item: item[1], reverse=True):
+        if seconds >= 0.0005:
+            print(f"  {package:<24} {seconds * 1000:>8.1f} ms")
+
+def run(job, profile=False):
+    module_name, function_name = JOBS[job]
+    timings = profile_imports() if profile else None
+
+    # Goes through builtins.__import__, so the profiler sees the job module too
+    __import__(module_name)
+    function = getattr(sys.modules[module_name], function_name)
+
+    from functions.metrics import record_duration
+    startup = time.perf_counter() - started
+    record_duration('startup', startup)
+
+    if not profile:
+        return function()
+
+    print(f"Interpreter startup: {interpreter * 1000:.1f} ms CPU")
+    print_import_report("Until the job started", timings, startup)
+    before = dict(timings)
+    function()
+
+    # Imports the job deferred until first use
+    deferred = {package: seconds - before.get(package, 0.0) for package, seconds in timings.items()}
+    print_import_report("Deferred imports during the job", deferred, sum(deferred.values()))
+
+if __name__ == "__main__":
+    arguments = [argument for argument in sys.argv[1:] if not argument.startswith('--')]
+    if len(arguments) != 1 or arguments[0] not in JOBS:
+        raise SystemExit(f"Usage: python3 -m scripts.run {'|'.join(JOBS)} [--profile-imports]")
+
+    run(arguments[0], '--profile-imports' in sys.argv)
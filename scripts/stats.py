@@ -1,50 +1,77 @@
-import mysql.connector
-import json
 from datetime import datetime, timedelta
 import math
 
-from functions.cpu import get_cpu_usage, get_cpu_temp
-from functions.memory import get_memory, get_swap_memory
-from functions.disk import get_disk_usage, get_disk_io, get_disk_wait
-from functions.network import get_network_io
+from functions.alerts import send_alert, flush_alerts
+from functions.config import load_config
+from functions.database import connect_db
+from functions.metrics import run_steps, timed, save_metrics
+from functions.ingest import forwards_to_ingest
+from functions.partitions import retention_lock, rotate_partitions
+from functions.process import describe_top_processes, process_rows
+from functions.snapshot import collect_snapshot
+from functions.spool import append_rows, flush_spool
+from functions.state import get_state, set_state
 
-def load_config():
-    with open('config.json') as f:
-        config = json.load(f)
-    return config
+# Metric -> (resource name, threshold, unit)
+RESOURCES = {
+    'cpu': ("CPU", 'cpu', "%"),
+    'cpu_temp': ("CPU Temperature", 'temperature', "ºC"),
+    'memory': ("Memory", 'memory', "%"),
+    'swap': ("Swap", 'swap', "%"),
+    'disk': ("Disk", 'disk', "%"),
+    'disk_read': ("Disk Read", 'io', " MB/s"),
+    'disk_write': ("Disk Write", 'io', " MB/s"),
+    'disk_wait': ("Disk Wait", 'iowait', "%"),
+    'network_receive': ("Network Receive", 'network', " Mbps"),
+    'network_transmit': ("Network Transmit", 'network', " Mbps"),
+}
 
-def connect_db(database):
-    config = load_config()
-    db_config = config['databases'][database]
-    connection = mysql.connector.connect(
-        host=db_config['host'],
-        user=db_config['user'],
-        password=db_config['password'],
-        database=db_config['database'],
-        charset=db_config['charset'] if 'charset' in db_config else 'utf8mb4',
-        collation=db_config['collation'] if 'collation' in db_config else 'utf8mb4_unicode_ci'
-    )
-    return connection
+# Metric -> (process ranking, unit) named in its alerts when processes are collected
+ATTRIBUTION = {
+    'cpu': ('cpu', "%"),
+    'memory': ('memory', " MB"),
+    'swap': ('memory', " MB"),
+    'disk_read': ('io', " MB/s"),
+    'disk_write': ('io', " MB/s"),
+    'disk_wait': ('io', " MB/s"),
+}
+
+# Without rules in config.json, alert when the last 6 samples are all over the threshold
+DEFAULT_RULES = [{"type": "min", "window": 6, "above": "threshold"}]
+
+COUNT_COLUMNS = (
+    'cpu_count', 'cpu_temp_count', 'memory_count', 'swap_count', 'disk_count',
+    'disk_read_count', 'disk_write_count', 'disk_wait_count',
+    'network_receive_count', 'network_transmit_count',
+)
 
+# Nodes forwarding to an ingest server leave retention to the ingest service
+@timed('stats.clean')
 def clean_old_records():
+    if forwards_to_ingest():
+        return
+
     connection = connect_db('system_monitoring')
     cursor = connection.cursor()
     cutoff_date = datetime.now() - timedelta(days=30)
     cutoff_timestamp = cutoff_date.strftime('%Y-%m-%d %H:%M:%S')
-    cursor.execute("""DELETE FROM system_stats WHERE timestamp < %s""", (cutoff_timestamp,))
+    with retention_lock(cursor) as acquired:
+        # Skip this run if another process is already applying retention
+        if acquired:
+            for table in ('system_stats', 'device_stats', 'process_stats', 'self_stats'):
+                if not rotate_partitions(cursor, table, 30):
+                    cursor.execute(f"""DELETE FROM {table} WHERE timestamp < %s""", (cutoff_timestamp,))
     connection.commit()
     cursor.close()
     connection.close()
 
+@timed('stats.save')
 def save_to_db(cpu, cpu_temp, memory, swap, disk, disk_read, disk_write, disk_wait, network_receive, network_transmit):
     latest_record = get_latest_system_stats()
 
     config = load_config()
     thresholds = config['thresholds']
     
-    connection = connect_db('system_monitoring')
-    cursor = connection.cursor()
-
     cpu_count = latest_record['cpu_count'] + 1 if cpu > thresholds['cpu'] else 0
     cpu_temp_count = latest_record['cpu_temp_count'] + 1 if cpu_temp > thresholds['temperature'] else 0
     memory_count = latest_record['memory_count'] + 1 if memory > thresholds['memory'] else 0
@@ -56,83 +83,111 @@ def save_to_db(cpu, cpu_temp, memory, swap, disk, disk_read, disk_write, disk_wa
     network_receive_count = latest_record['network_receive_count'] + 1 if network_receive > thresholds['network'] else 0
     network_transmit_count = latest_record['network_transmit_count'] + 1 if network_transmit > thresholds['network'] else 0
 
-    cursor.execute(""" 
-        INSERT INTO system_stats (
-            cpu, cpu_temp, memory, swap, disk, disk_read, disk_write, network_receive, 
-            network_transmit, disk_wait, 
-            cpu_count, cpu_temp_count, memory_count, swap_count, disk_count, 
-            disk_read_count, disk_write_count, disk_wait_count, 
-            network_receive_count, network_transmit_count
-        )
-        VALUES (
-            %s, %s, %s, %s, %s, %s, %s, %s, %s,
-            %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
-        )
-    """, (
-        cpu, cpu_temp, 
-        memory, swap, 
-        disk, disk_read, disk_write, 
-        network_receive, network_transmit, disk_wait,
-        cpu_count, cpu_temp_count, memory_count, swap_count, disk_count, 
-        disk_read_count, disk_write_count, disk_wait_count, 
+    # Write the sample to the local spool, the flusher inserts it into system_stats
+    append_rows('system_stats', [{
+        'cpu': cpu, 'cpu_temp': cpu_temp,
+        'memory': memory, 'swap': swap,
+        'disk': disk, 'disk_read': disk_read, 'disk_write': disk_write,
+        'network_receive': network_receive, 'network_transmit': network_transmit, 'disk_wait': disk_wait,
+        'cpu_count': cpu_count, 'cpu_temp_count': cpu_temp_count, 'memory_count': memory_count,
+        'swap_count': swap_count, 'disk_count': disk_count,
+        'disk_read_count': disk_read_count, 'disk_write_count': disk_write_count, 'disk_wait_count': disk_wait_count,
+        'network_receive_count': network_receive_count, 'network_transmit_count': network_transmit_count,
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    }])
+
+    # Remember the new counters so the next run does not read them back from MySQL
+    set_state('system_stats', dict(zip(COUNT_COLUMNS, (
+        cpu_count, cpu_temp_count, memory_count, swap_count, disk_count,
+        disk_read_count, disk_write_count, disk_wait_count,
         network_receive_count, network_transmit_count
-    ))
+    ))))
 
-    connection.commit()
-    cursor.close()
-    connection.close()
+# Save the per-disk, per-interface and per-mount samples to the device_stats table
+@timed('stats.save_devices')
+def save_devices_to_db(device_samples):
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    rows = [row for samples in device_samples for row in samples.rows(timestamp)]
+    append_rows('device_stats', rows)
 
-def insert_alert(phone, message):
-    connection = connect_db('whatsapp')
-    cursor = connection.cursor()
+# Save the top processes of every ranking to the process_stats table
+@timed('stats.save_processes')
+def save_processes_to_db(top_processes):
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    append_rows('process_stats', list(process_rows(top_processes, timestamp)))
+
+# Queue a resource alert, repeated alerts for the same node and resource are
+# held back by the alert cooldown and a cycle's alerts share one message
+def insert_alert(phone, resource_name, message):
     current_datetime = get_current_time()
     config = load_config()
     node = config.get('node', 'Unknown Node') 
-    message_with_timestamp_and_node = f"⚠️ *Resource threshold reached* ⚠️ \n\n*Node:* {node} \n*Date:* {current_datetime} \n\n{message}"
-    cursor.execute("""
-        INSERT INTO messages (phone, message)
-        VALUES (%s, %s)
-    """, (phone, message_with_timestamp_and_node))
-    connection.commit()
-    cursor.close()
-    connection.close()
+    title = f"⚠️ *Resource threshold reached* ⚠️ \n\n*Node:* {node} \n*Date:* {current_datetime}"
+    send_alert(phone, title, message, key=f"{node}:{resource_name}")
+
+@timed('stats.check_thresholds')
+def check_thresholds(cpu, cpu_temp, memory_used_percentage, swap_used_percentage, disk_used_percentage, disk_read, disk_write, disk_wait, network_receive_mbps, network_transmit_mbps, top_processes=None):
+    from functions.anomaly import detect_anomalies  # Imports numpy, deferred until there is a sample to evaluate
 
-def check_thresholds(cpu, cpu_temp, memory_used_percentage, swap_used_percentage, disk_used_percentage, disk_read, disk_write, disk_wait, network_receive_mbps, network_transmit_mbps):
     config = load_config()
     thresholds = config['thresholds']
-    alert_message = ""
-    latest_record = get_latest_system_stats()
+    anomaly_config = config.get('anomaly', {})
+    rules = anomaly_config.get('rules', {})
 
-    def check_and_alert(resource_name, value, threshold, count, count_threshold, unit=""):
-        if value > threshold and count > count_threshold:
-            return f"{resource_name} usage is {value}{unit}\n"
-        return ""
-    
-    alert_message += check_and_alert("CPU", cpu, thresholds['cpu'], latest_record['cpu_count'], 5, "%")
-    alert_message += check_and_alert("CPU Temperature", cpu_temp, thresholds['temperature'], latest_record['cpu_temp_count'], 5, "ºC")
-    alert_message += check_and_alert("Memory", memory_used_percentage, thresholds['memory'], latest_record['memory_count'], 5, "%")
-    alert_message += check_and_alert("Swap", swap_used_percentage, thresholds['swap'], latest_record['swap_count'], 5, "%")
-    alert_message += check_and_alert("Disk", disk_used_percentage, thresholds['disk'], latest_record['disk_count'], 5, "%")
-    alert_message += check_and_alert("Disk Read", disk_read, thresholds['io'], latest_record['disk_read_count'], 5, " MB/s")
-    alert_message += check_and_alert("Disk Write", disk_write, thresholds['io'], latest_record['disk_write_count'], 5, " MB/s")
-    alert_message += check_and_alert("Disk Wait", disk_wait, thresholds['iowait'], latest_record['disk_wait_count'], 5, " ms")
-    alert_message += check_and_alert("Network Receive", network_receive_mbps, thresholds['network'], latest_record['network_receive_count'], 5, " Mbps")
-    alert_message += check_and_alert("Network Transmit", network_transmit_mbps, thresholds['network'], latest_record['network_transmit_count'], 5, " Mbps")
-
-    if alert_message:
-        alert_message = alert_message.strip()
-        insert_alert(config['resources-alerts-channel'], alert_message)
+    values = {
+        'cpu': cpu, 'cpu_temp': cpu_temp, 'memory': memory_used_percentage, 'swap': swap_used_percentage,
+        'disk': disk_used_percentage, 'disk_read': disk_read, 'disk_write': disk_write, 'disk_wait': disk_wait,
+        'network_receive': network_receive_mbps, 'network_transmit': network_transmit_mbps,
+    }
 
+    # Every metric is evaluated against its recent history in one batched pass
+    anomalies = detect_anomalies(
+        'stats', values,
+        {metric: rules.get(metric, DEFAULT_RULES) for metric in values},
+        {metric: thresholds[RESOURCES[metric][1]] for metric in values},
+        capacity=anomaly_config.get('history', 60),
+    )
+
+    for metric, rule, value in anomalies:
+        resource_name, _, unit = RESOURCES[metric]
+        message = f"{resource_name} usage is {values[metric]}{unit}"
+        if rule['type'] != 'min':
+            message += f" ({rule['type']} {round(value, 2)})"
+
+        # Name the processes behind the usage when they were collected
+        if top_processes and metric in ATTRIBUTION:
+            ranking, process_unit = ATTRIBUTION[metric]
+            if top_processes[ranking]:
+                message += f"\n  Top: {describe_top_processes(top_processes[ranking], ranking, process_unit)}"
+        insert_alert(config['resources-alerts-channel'], resource_name, message)
+
+# Latest threshold counters, from the local state cache when available.
+# Without it the counters start over at 0 on nodes forwarding to an ingest
+# server (they never query the central database) or when MySQL is down.
 def get_latest_system_stats():
+    latest_record = get_state('system_stats')
+    if latest_record is None:
+        latest_record = {column: 0 for column in COUNT_COLUMNS}
+        if not forwards_to_ingest():
+            try:
+                latest_record = query_latest_system_stats()
+            except Exception as error:
+                print(f"\033[31mCould not read the latest counters, starting over: {error}\033[0m")
+        set_state('system_stats', {column: latest_record[column] for column in COUNT_COLUMNS})
+    return latest_record
+
+@timed('stats.latest')
+def query_latest_system_stats():
     connection = connect_db('system_monitoring')
     cursor = connection.cursor(dictionary=True) 
     query = """
         SELECT *
         FROM system_stats
+        WHERE node_id = %s
         ORDER BY timestamp DESC
         LIMIT 1
     """
-    cursor.execute(query)  
+    cursor.execute(query, (load_config().get('node', ''),))
     result = cursor.fetchone() 
     cursor.close()
     connection.close()
@@ -168,18 +223,28 @@ def get_latest_system_stats():
 def get_current_time():
     return datetime.now().strftime('%d %b %Y %H:%M Hs')
 
+@timed('stats.cycle')
 def display_and_save_info():
     config = load_config()
     thresholds = config["thresholds"]
     
-    cpu = get_cpu_usage()
-    cpu_temp = get_cpu_temp()
-    memory_used_percentage = get_memory()
-    swap_used_percentage = get_swap_memory()
-    disk_used_percentage = get_disk_usage()
-    disk_read, disk_write = get_disk_io()
-    disk_wait = get_disk_wait()
-    network_receive_mbps, network_transmit_mbps = get_network_io()
+    # Every metric is sampled over the same one second window
+    collect_devices = config.get('devices', False)
+    process_config = config.get('processes', {})
+    collect_processes = process_config.get('enabled', False)
+    with timed('stats.collect'):
+        snapshot = collect_snapshot(
+            config.get('sample_interval', 1), devices=collect_devices, processes=collect_processes,
+            process_budget=process_config.get('budget', 0.2), top=process_config.get('top', 5),
+        )
+    cpu = snapshot['cpu']
+    cpu_temp = snapshot['cpu_temp']
+    memory_used_percentage = snapshot['memory']
+    swap_used_percentage = snapshot['swap']
+    disk_used_percentage = snapshot['disk']
+    disk_read, disk_write = snapshot['disk_read'], snapshot['disk_write']
+    disk_wait = snapshot['disk_wait']
+    network_receive_mbps, network_transmit_mbps = snapshot['network_receive'], snapshot['network_transmit']
 
     cpu = math.trunc(cpu)
     cpu_temp = math.trunc(cpu_temp) if cpu_temp is not None else None
@@ -208,8 +273,20 @@ def display_and_save_info():
     print_with_color(f"Network Transmit: {network_transmit_mbps} Mbps", network_transmit_mbps > thresholds["network"])
 
     save_to_db(cpu, cpu_temp, memory_used_percentage, swap_used_percentage, disk_used_percentage, disk_read, disk_write, disk_wait, network_receive_mbps, network_transmit_mbps)
-    check_thresholds(cpu, cpu_temp, memory_used_percentage, swap_used_percentage, disk_used_percentage, disk_read, disk_write, disk_wait, network_receive_mbps, network_transmit_mbps)
+    if collect_devices:
+        save_devices_to_db(snapshot['devices'])
+    if collect_processes:
+        save_processes_to_db(snapshot['processes'])
+    check_thresholds(cpu, cpu_temp, memory_used_percentage, swap_used_percentage, disk_used_percentage, disk_read, disk_write, disk_wait, network_receive_mbps, network_transmit_mbps, snapshot.get('processes'))
+
+# Main function of a single stats run, also started by scripts/run.py
+def main():
+    # Collect first, so a database outage never costs us the sample
+    failures = run_steps(display_and_save_info, clean_old_records, flush_spool)
+    flush_alerts()
+    save_metrics('stats')
+    if failures:
+        raise SystemExit(1)
 
 if __name__ == "__main__":
-    clean_old_records()
-    display_and_save_info()
+    main()
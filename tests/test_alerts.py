@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from functions import alerts, state
+
+class DispatchTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patcher = mock.patch.multiple(state, STATE_FILE=os.path.join(directory.name, 'state.json'),
+                                      cache={'mtime': None, 'state': {}})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.sent = []
+        patcher = mock.patch.object(alerts, 'insert_messages', self.sent.append)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_same_key_is_sent_once_per_cooldown(self):
+        alerts.dispatch([('123', 'Down', 'a is down', 'a'), ('123', 'Down', 'b is down', 'b')], 900)
+        alerts.dispatch([('123', 'Down', 'a is down', 'a'), ('123', 'Note', 'no key', None)], 900)
+
+        self.assertEqual(self.sent, [
+            [('123', "Down \n\na is down\nb is down")],
+            [('123', "Note \n\nno key")],
+        ])
+
+    def test_failed_insert_does_not_suppress_the_key(self):
+        with mock.patch.object(alerts, 'insert_messages', side_effect=RuntimeError("whatsapp DB down")):
+            with self.assertRaises(RuntimeError):
+                alerts.dispatch([('123', 'Down', 'a is down', 'a')], 900)
+        self.assertEqual(state.get_state('alerts'), {})
+
+        alerts.dispatch([('123', 'Down', 'a is down', 'a')], 900)
+        self.assertEqual(self.sent, [[('123', "Down \n\na is down")]])
+        self.assertIn('a', state.get_state('alerts'))
+
+    def test_failed_insert_keeps_other_cooldowns(self):
+        alerts.dispatch([('123', 'Down', 'a is down', 'a')], 900)
+        with mock.patch.object(alerts, 'insert_messages', side_effect=RuntimeError("whatsapp DB down")):
+            with self.assertRaises(RuntimeError):
+                alerts.dispatch([('123', 'Down', 'a is down', 'a'), ('123', 'Down', 'b is down', 'b')], 900)
+
+        self.assertEqual(list(state.get_state('alerts')), ['a'])
+
+if __name__ == "__main__":
+    unittest.main()
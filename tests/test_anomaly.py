@@ -0,0 +1,84 @@
+import math
+import unittest
+
+import numpy as np
+
+from functions import anomaly
+
+# Buffer with one series per list of samples, oldest first (None is a gap)
+def make_buffer(series, capacity=60):
+    buffer = anomaly.RingBuffer(capacity=capacity)
+    for position in range(max(len(samples) for samples in series.values())):
+        buffer.push({key: samples[position] for key, samples in series.items() if position < len(samples)})
+    return buffer
+
+def evaluate(series, rule, limit):
+    buffer = make_buffer(series)
+    triggered, value = anomaly.evaluate_rule(buffer, rule, np.full(len(buffer.keys), limit))
+    return {key: (bool(triggered[row]), float(value[row])) for key, row in buffer.index.items()}
+
+class RuleTest(unittest.TestCase):
+    def test_min_needs_every_sample_above(self):
+        result = evaluate({'high': [90, 95, 91], 'dip': [90, 50, 91], 'gap': [90, None, 91]},
+                          {'type': 'min', 'window': 3}, 80)
+
+        self.assertEqual(result['high'], (True, 90.0))
+        self.assertFalse(result['dip'][0])
+        self.assertFalse(result['gap'][0])
+
+    def test_mean_and_percentile(self):
+        series = {'a': [10, 20, 30, 40]}
+
+        self.assertEqual(evaluate(series, {'type': 'mean', 'window': 4}, 20)['a'], (True, 25.0))
+        self.assertEqual(evaluate(series, {'type': 'percentile', 'window': 4, 'q': 50}, 30)['a'], (False, 25.0))
+
+    def test_ewma_weights_recent_samples(self):
+        triggered, value = evaluate({'a': [0, 0, 100]}, {'type': 'ewma', 'window': 3, 'alpha': 0.5}, 50)['a']
+
+        self.assertTrue(triggered)
+        self.assertAlmostEqual(value, 100 / 1.75)
+
+    def test_rate(self):
+        self.assertEqual(evaluate({'a': [10, 20, 40]}, {'type': 'rate', 'window': 3}, 10)['a'], (True, 15.0))
+
+    def test_zscore(self):
+        result = evaluate({'spike': [10, 12] * 5 + [30], 'normal': [10, 12] * 5 + [12]},
+                          {'type': 'zscore', 'window': 11}, 4)
+
+        self.assertEqual(result['spike'], (True, 19.0))
+        self.assertFalse(result['normal'][0])
+
+    def test_zscore_of_a_flat_series_does_not_trigger(self):
+        triggered, value = evaluate({'idle': [0] * 30 + [1]}, {'type': 'zscore', 'window': 31}, 4)['idle']
+
+        self.assertFalse(triggered)
+        self.assertTrue(math.isnan(value))
+
+    def test_zscore_min_stddev(self):
+        rule = {'type': 'zscore', 'window': 31, 'min_stddev': 2}
+        result = evaluate({'idle': [0, 1] * 15 + [1], 'busy': [0] * 30 + [50]}, rule, 4)
+
+        self.assertEqual(result['idle'], (False, 0.25))
+        self.assertEqual(result['busy'], (True, 25.0))
+
+    def test_short_history_does_not_trigger(self):
+        self.assertFalse(evaluate({'new': [99]}, {'type': 'mean', 'window': 6}, 80)['new'][0])
+
+    def test_unknown_rule(self):
+        with self.assertRaises(ValueError):
+            evaluate({'a': [1]}, {'type': 'median'}, 0)
+
+class DetectTest(unittest.TestCase):
+    def setUp(self):
+        anomaly.buffers.clear()
+        self.addCleanup(anomaly.buffers.clear)
+
+    def test_threshold_limits_are_per_series(self):
+        rules = {'a': [{'type': 'min', 'window': 2}], 'b': [{'type': 'min', 'window': 2}]}
+        for _ in range(2):
+            anomalies = anomaly.detect_anomalies('test', {'a': 50, 'b': 50}, rules, {'a': 40, 'b': 60}, persist=False)
+
+        self.assertEqual(anomalies, [('a', {'type': 'min', 'window': 2}, 50.0)])
+
+if __name__ == "__main__":
+    unittest.main()
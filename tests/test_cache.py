@@ -0,0 +1,63 @@
+import threading
+import time
+import unittest
+
+from functions.cache import RangeCache
+
+class RangeCacheTest(unittest.TestCase):
+    def test_concurrent_misses_load_once(self):
+        cache = RangeCache()
+        loads = []
+        def load():
+            loads.append(None)
+            time.sleep(0.1)
+            return [1, 2, 3]
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_load('key', 'system_stats', None, load)))
+                   for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(loads), 1)
+        self.assertEqual(results, [[1, 2, 3]] * 10)
+
+    def test_failed_load_is_retried(self):
+        cache = RangeCache()
+        def fail():
+            raise RuntimeError("MySQL is down")
+
+        with self.assertRaises(RuntimeError):
+            cache.get_or_load('key', 'system_stats', None, fail)
+        self.assertEqual(cache.get_or_load('key', 'system_stats', None, lambda: 'loaded'), 'loaded')
+
+    def test_invalidation_only_drops_ranges_past_the_timestamp(self):
+        cache = RangeCache()
+        cache.set('old', 'a', 'system_stats', 10)
+        cache.set('recent', 'b', 'system_stats', 30)
+        cache.set('now', 'c', 'system_stats', None)
+        cache.set('other', 'd', 'latencies', None)
+
+        self.assertEqual(cache.invalidate_after('system_stats', 20), 2)
+        self.assertEqual([cache.get(key) for key in ('old', 'recent', 'now', 'other')], ['a', None, None, 'd'])
+
+    def test_load_invalidated_while_running_is_not_cached(self):
+        cache = RangeCache()
+        started = threading.Event()
+        def load():
+            started.set()
+            time.sleep(0.1)
+            return 'stale'
+
+        thread = threading.Thread(target=cache.get_or_load, args=('now', 'system_stats', None, load))
+        thread.start()
+        started.wait()
+        cache.invalidate_after('system_stats', 0)
+        thread.join()
+
+        self.assertIsNone(cache.get('now'))
+
+if __name__ == "__main__":
+    unittest.main()
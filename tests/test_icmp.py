@@ -0,0 +1,141 @@
+import math
+import socket
+import struct
+import threading
+import unittest
+from unittest import mock
+
+from functions import icmp
+
+# Stand-in for the network: UDP sockets on loopback addresses answer the echo
+# requests sent to them, and the probes use a UDP socket instead of an ICMP one.
+# drop(number) decides whether the n-th request a responder gets is lost.
+class Responder:
+    def __init__(self, address, port=0, drop=lambda number: False):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((address, port))
+        self.sock.settimeout(0.05)
+        self.port = self.sock.getsockname()[1]
+        self.drop = drop
+        self.received = 0
+        self.running = True
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def serve(self):
+        while self.running:
+            try:
+                packet, client = self.sock.recvfrom(2048)
+            except socket.timeout:
+                continue
+
+            self.received += 1
+            if self.drop(self.received):
+                continue
+
+            _, _, _, identifier, sequence = struct.unpack('!BBHHH', packet[:8])
+            self.sock.sendto(struct.pack('!BBHHH', icmp.ICMP_ECHO_REPLY, 0, 0, identifier, sequence) + packet[8:], client)
+
+    def close(self):
+        self.running = False
+        self.thread.join()
+        self.sock.close()
+
+def open_udp_socket():
+    return socket.socket(socket.AF_INET, socket.SOCK_DGRAM), True
+
+class ProbeTest(unittest.TestCase):
+    def setUp(self):
+        self.responders = []
+
+    def tearDown(self):
+        for responder in self.responders:
+            responder.close()
+
+    # Start responders on the given loopback addresses, all on the same port
+    def respond(self, *drops):
+        port = 0
+        for number, drop in enumerate(drops, 1):
+            responder = Responder(f"127.0.0.{number}", port, drop)
+            port = responder.port
+            self.responders.append(responder)
+        return port
+
+    def test_replies_are_matched_to_their_host(self):
+        port = self.respond(lambda number: False, lambda number: False)
+        results = icmp.run_probes({
+            'a': ['127.0.0.1', 0.01, 3, 1, 3],
+            'b': ['127.0.0.2', 0.01, 3, 1, 3],
+            'unresolved': [None, 0.01, 3, 1, 3],
+        }, open_udp_socket, port)
+
+        self.assertEqual(len(results['a']), 3)
+        self.assertTrue(all(rtt is not None for rtt in results['a'] + results['b']))
+        self.assertEqual(results['unresolved'], [None, None, None])
+
+    def test_lost_requests_are_retried(self):
+        port = self.respond(lambda number: number < 3, lambda number: True)
+        results = icmp.probe_hosts([('flaky', '127.0.0.1'), ('down', '127.0.0.2')],
+                                   timeout=0.4, attempts=4, open_socket=open_udp_socket, port=port)
+
+        self.assertIsNotNone(results['flaky'])
+        self.assertIsNone(results['down'])
+        self.assertEqual(self.responders[0].received, 3)  # Stops once it answered
+        self.assertEqual(self.responders[1].received, 4)
+
+    def test_burst_loss(self):
+        port = self.respond(lambda number: number % 2 == 0)
+        results = icmp.probe_bursts([('lossy', '127.0.0.1')], count=6, timeout=0.3, spacing=0.01,
+                                    open_socket=open_udp_socket, port=port)
+
+        self.assertEqual([rtt is None for rtt in results['lossy']], [False, True] * 3)
+        self.assertEqual(icmp.summarize_rtts(results['lossy'])['packet_loss'], 50.0)
+
+    def test_big_sweeps_use_several_sockets(self):
+        port = self.respond(lambda number: False, lambda number: False)
+        targets = [(f"a{number}", '127.0.0.1') for number in range(5)] + [(f"b{number}", '127.0.0.2') for number in range(5)]
+
+        opened = []
+        def open_socket():
+            opened.append(None)
+            return open_udp_socket()
+
+        with mock.patch.object(icmp, 'MAX_REQUESTS_PER_SOCKET', 4):
+            results = icmp.probe_bursts(targets, count=2, timeout=1, spacing=0.01, open_socket=open_socket, port=port)
+
+        self.assertEqual(len(opened), 5)
+        self.assertTrue(all(rtt is not None for rtts in results.values() for rtt in rtts))
+
+class ResolveTest(unittest.TestCase):
+    def test_slow_names_are_given_up(self):
+        release = threading.Event()
+        def gethostbyname(host):
+            if host == 'slow':
+                release.wait()
+            return '192.0.2.1'
+
+        with mock.patch.object(icmp.socket, 'gethostbyname', gethostbyname):
+            addresses = icmp.resolve_hosts(['fast', 'slow'], timeout=0.1)
+        release.set()
+
+        self.assertEqual(addresses, {'fast': '192.0.2.1', 'slow': None})
+
+class SummarizeTest(unittest.TestCase):
+    def test_statistics(self):
+        summary = icmp.summarize_rtts([10.0, None, 20.0, 30.0])
+
+        self.assertEqual(summary['packet_loss'], 25.0)
+        self.assertEqual((summary['rtt_min'], summary['rtt_avg'], summary['rtt_max']), (10.0, 20.0, 30.0))
+        self.assertAlmostEqual(summary['rtt_mdev'], math.sqrt(200 / 3))
+        self.assertEqual(summary['jitter'], 10.0)
+        self.assertEqual(summary['rtt_p95'], 30.0)
+
+    def test_everything_lost(self):
+        summary = icmp.summarize_rtts([None, None])
+
+        self.assertEqual(summary['packet_loss'], 100.0)
+        self.assertIsNone(summary['rtt_avg'])
+        self.assertIsNone(summary['rtt_p95'])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from functions import spool
+
+class FakeWriter:
+    def __init__(self, fail_on=()):
+        self.batches = []
+        self.calls = 0
+        self.fail_on = fail_on  # Numbers of the calls that raise, from 1
+
+    def __call__(self, table, columns, rows):
+        self.calls += 1
+        if self.calls in self.fail_on:
+            raise RuntimeError("MySQL is down")
+        self.batches.append((table, list(columns), [row['value'] for row in rows]))
+
+    # Every value written, in order
+    def values(self):
+        return [value for _, _, values in self.batches for value in values]
+
+class SpoolTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.configure()
+
+    def configure(self, segment_size=4 * 1024 * 1024, batch_size=500):
+        config = {'node': 'node-1', 'spool': {'directory': self.directory, 'segment_size': segment_size, 'batch_size': batch_size}}
+        patcher = mock.patch.object(spool, 'load_config', lambda: config)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def append(self, table, *values):
+        spool.append_rows(table, [{'value': value} for value in values])
+
+    def segments(self):
+        return spool.get_segments(self.directory)
+
+    def test_rows_are_written_in_order_by_table(self):
+        self.configure(batch_size=2)
+        self.append('system_stats', 1, 2, 3)
+        self.append('latencies', 4)
+        self.append('system_stats', 5)
+
+        writer = FakeWriter()
+        self.assertEqual(spool.flush_spool(writer), 5)
+        self.assertEqual(writer.batches, [
+            ('system_stats', ['node_id', 'value'], [1, 2]),
+            ('system_stats', ['node_id', 'value'], [3]),
+            ('latencies', ['node_id', 'value'], [4]),
+            ('system_stats', ['node_id', 'value'], [5]),
+        ])
+
+        # Nothing is written twice
+        self.assertEqual(spool.flush_spool(writer), 0)
+
+    def test_failed_batch_is_resumed_from_the_cursor(self):
+        self.configure(batch_size=2)
+        self.append('system_stats', 1, 2, 3, 4, 5)
+
+        failing = FakeWriter(fail_on=(2,))
+        with self.assertRaises(RuntimeError):
+            spool.flush_spool(failing)
+        self.assertEqual(failing.values(), [1, 2])
+
+        writer = FakeWriter()
+        self.assertEqual(spool.flush_spool(writer), 3)
+        self.assertEqual(writer.values(), [3, 4, 5])
+
+    def test_partial_trailing_line_is_left_for_later(self):
+        self.append('system_stats', 1)
+        path = os.path.join(self.directory, self.segments()[-1])
+        line = b'{"table": "system_stats", "row": {"node_id": "node-1", "value": 2}}\n'
+        with open(path, 'ab') as f:
+            f.write(line[:20])  # A collector is still writing this record
+
+        writer = FakeWriter()
+        self.assertEqual(spool.flush_spool(writer), 1)
+
+        with open(path, 'ab') as f:
+            f.write(line[20:])
+        self.assertEqual(spool.flush_spool(writer), 1)
+        self.assertEqual(writer.values(), [1, 2])
+
+    def test_segments_roll_over_and_drained_ones_are_removed(self):
+        self.configure(segment_size=50)  # Smaller than one record
+        for value in range(1, 5):
+            self.append('system_stats', value)
+        self.assertEqual(len(self.segments()), 4)
+
+        writer = FakeWriter()
+        self.assertEqual(spool.flush_spool(writer), 4)
+        self.assertEqual(writer.values(), [1, 2, 3, 4])
+
+        # The newest segment is kept, collectors may still append to it
+        self.assertEqual(self.segments(), [spool.segment_name(4)])
+
+        self.append('system_stats', 5)
+        self.assertEqual(self.segments(), [spool.segment_name(4), spool.segment_name(5)])
+        self.assertEqual(spool.flush_spool(writer), 1)
+        self.assertEqual(writer.values(), [1, 2, 3, 4, 5])
+        self.assertEqual(self.segments(), [spool.segment_name(5)])
+
+if __name__ == "__main__":
+    unittest.main()